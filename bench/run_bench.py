@@ -0,0 +1,214 @@
+"""
+Offline benchmark: drive the real pipeline stages against local stand-ins.
+
+    python bench/run_bench.py --runs 3 --json bench_result.json
+    python bench/run_bench.py --baseline bench_result.json --tolerance 0.25
+
+Everything (browser profiles, run store, cache, metrics) lives in a throwaway
+working directory, so no credentials or live sites are involved.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import pickle
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from server import FixtureConfig, FixtureServer
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+PROFILES = ("chatgpt", "notebooklm", "spotify")
+
+logger = logging.getLogger("bench")
+
+
+def prepare_workspace() -> Path:
+    """chdir into a temp workspace with empty cookie stores for every profile."""
+    workspace = Path(tempfile.mkdtemp(prefix="podcast-bench-"))
+    os.chdir(workspace)
+    for profile in PROFILES:
+        (workspace / profile).mkdir()
+        with open(workspace / profile / "cookies.json", "wb") as f:
+            pickle.dump([], f)
+    return workspace
+
+
+async def bench_stages(runs: int, headless: bool) -> dict[str, list[float]]:
+    """Time get_latest_reply, generate_podcast and upload_podcast one by one."""
+    from chatgpt_pull import get_latest_reply
+    from notebooklm_gen import generate_podcast
+    from spotify_upload import upload_podcast
+    from utils import BrowserPool
+
+    timings: dict[str, list[float]] = {}
+    pool = BrowserPool(headless=headless)
+    try:
+        for i in range(1, runs + 1):
+            t = time.perf_counter()
+            md, title, description = await get_latest_reply(pool=pool)
+            timings.setdefault("chatgpt", []).append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            title2, summary, wav = await generate_podcast(md, pool=pool)
+            timings.setdefault("notebooklm", []).append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            await upload_podcast(
+                title or title2, description or summary, wav, pool=pool
+            )
+            timings.setdefault("spotify", []).append(time.perf_counter() - t)
+            logger.info("run %d/%d done", i, runs)
+            await pool.end_run()
+    finally:
+        await pool.close()
+    return timings
+
+
+async def bench_pipeline(runs: int, headless: bool) -> dict[str, list[float]]:
+    """Time full `run_once` runs and collect their stage spans."""
+    from metrics import METRICS_DIR
+    from pipeline import run_once
+    from utils import BrowserPool
+
+    timings: dict[str, list[float]] = {}
+    pool = BrowserPool(headless=headless)
+    try:
+        for i in range(1, runs + 1):
+            shutil.rmtree("podcast_cache", ignore_errors=True)  # force generation
+            t = time.perf_counter()
+            run_id = await run_once(pool)
+            timings.setdefault("pipeline", []).append(time.perf_counter() - t)
+            data = json.loads((METRICS_DIR / f"{run_id}.json").read_text())
+            for span in data["spans"]:
+                if span["name"].startswith("stage."):
+                    timings.setdefault(span["name"], []).append(span["duration"])
+            logger.info("run %d/%d done", i, runs)
+            await pool.end_run()
+    finally:
+        await pool.close()
+    return timings
+
+
+async def compare_modes(runs: int) -> dict[str, list[float]]:
+    """Start a browser per profile headed and headless; report startup and RSS."""
+    from notebooklm_gen import notebooklm_url
+    from utils import _process_tree_rss_mb, start_browser
+
+    timings: dict[str, list[float]] = {}
+    for headless in (False, True):
+        mode = "headless" if headless else "headed"
+        for _ in range(runs):
+            for profile in PROFILES:
+                t = time.perf_counter()
+                browser = await start_browser(profile_name=profile, headless=headless)
+                timings.setdefault(f"{mode}.start_s", []).append(
+                    time.perf_counter() - t
+                )
+                await browser.main_tab.get(notebooklm_url())
+                rss = _process_tree_rss_mb(getattr(browser, "_process_pid", None))
+                if rss is not None:
+                    timings.setdefault(f"{mode}.rss_mb", []).append(rss)
+                await browser.stop()
+    return timings
+
+
+def summarize(timings: dict[str, list[float]]) -> dict[str, dict[str, float]]:
+    return {
+        name: {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+            "n": len(values),
+        }
+        for name, values in timings.items()
+    }
+
+
+def regressions(
+    result: dict[str, dict[str, float]], baseline: dict, tolerance: float
+) -> list[str]:
+    """Return the stages whose median is slower than the baseline allows."""
+    slow = []
+    for name, stats in result.items():
+        base = baseline.get(name, {}).get("median")
+        if base and stats["median"] > base * (1 + tolerance):
+            slow.append(f"{name}: {stats['median']:.2f}s vs baseline {base:.2f}s")
+    return slow
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--pipeline", action="store_true", help="Benchmark run_once instead of stages"
+    )
+    parser.add_argument(
+        "--compare-modes",
+        action="store_true",
+        help="Compare browser startup time and memory headed vs headless",
+    )
+    parser.add_argument("--chatgpt-mode", choices=("api", "dom"), default="api")
+    parser.add_argument("--headed", action="store_true", help="Show the browsers")
+    parser.add_argument(
+        "--generation-ms", type=int, default=FixtureConfig.generation_ms
+    )
+    parser.add_argument(
+        "--audio-seconds", type=float, default=FixtureConfig.audio_seconds
+    )
+    parser.add_argument("--json", type=Path, help="Write the summary to this file")
+    parser.add_argument(
+        "--baseline", type=Path, help="Fail if slower than this summary"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s"
+    )
+    json_out = args.json.resolve() if args.json else None
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+
+    config = FixtureConfig(
+        generation_ms=args.generation_ms, audio_seconds=args.audio_seconds
+    )
+    with FixtureServer(config) as server:
+        workspace = prepare_workspace()
+        os.environ.update(server.urls())
+        os.environ["conversation_id"] = "bench-conversation"
+        os.environ["CHATGPT_FETCH_MODE"] = args.chatgpt_mode
+        sys.path.insert(0, str(SRC))
+
+        if args.compare_modes:
+            timings = asyncio.run(compare_modes(args.runs))
+        else:
+            bench = bench_pipeline if args.pipeline else bench_stages
+            timings = asyncio.run(bench(args.runs, headless=not args.headed))
+
+    result = summarize(timings)
+    print(f"{'stage':<28} {'n':>3} {'median s':>9} {'min s':>8} {'max s':>8}")
+    for name, stats in result.items():
+        print(
+            f"{name:<28} {stats['n']:>3} {stats['median']:>9.2f} "
+            f"{stats['min']:>8.2f} {stats['max']:>8.2f}"
+        )
+    print(f"(workspace: {workspace})")
+
+    if json_out:
+        json_out.write_text(json.dumps(result, indent=2))
+    if baseline:
+        slow = regressions(result, baseline, args.tolerance)
+        for line in slow:
+            print(f"REGRESSION {line}")
+        return 1 if slow else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
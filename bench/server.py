@@ -0,0 +1,130 @@
+"""Local stand-ins for ChatGPT, NotebookLM and the Spotify episode wizard."""
+
+import io
+import json
+import logging
+import math
+import struct
+import threading
+import wave
+from dataclasses import dataclass
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FixtureConfig:
+    stream_ms: int = 1500  # ChatGPT "streaming" time of the last reply
+    ingest_ms: int = 1000  # NotebookLM source ingestion
+    generation_ms: int = 5000  # NotebookLM audio generation
+    audio_seconds: float = 30.0  # length of the served WAV
+    upload_ms_per_mb: int = 100  # Spotify upload speed
+
+
+def make_wav(seconds: float, rate: int = 22_050) -> bytes:
+    """Return a 16-bit mono WAV with a quiet intro, a tone and a quiet outro."""
+    frames = int(seconds * rate)
+    edge = int(0.3 * rate)
+    samples = (
+        0 if i < edge or i >= frames - edge
+        else int(8000 * math.sin(2 * math.pi * 220 * i / rate))
+        for i in range(frames)
+    )
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"".join(struct.pack("<h", s) for s in samples))
+    return buf.getvalue()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def __init__(self, config: FixtureConfig, wav: bytes, *args, **kwargs):
+        self.config = config
+        self.wav = wav
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, fmt, *args):
+        logger.debug("fixture: " + fmt, *args)
+
+    def _send(self, body: bytes, content_type: str, extra: dict | None = None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, name: str, **values):
+        html = (FIXTURES / name).read_text(encoding="utf-8")
+        for key, value in values.items():
+            html = html.replace("{{%s}}" % key, str(value))
+        self._send(html.encode(), "text/html; charset=utf-8")
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        cfg = self.config
+        if path == "/api/auth/session":
+            session = json.dumps({"accessToken": "bench"}).encode()
+            self._send(session, "application/json")
+        elif path.startswith("/backend-api/conversation/"):
+            body = (FIXTURES / "conversation.json").read_bytes()
+            self._send(body, "application/json")
+        elif path.startswith("/c/"):
+            self._page("chatgpt_conversation.html", STREAM_MS=cfg.stream_ms)
+        elif path in ("/", "/notebooklm"):
+            self._page(
+                "notebooklm.html",
+                INGEST_MS=cfg.ingest_ms,
+                GENERATION_MS=cfg.generation_ms,
+            )
+        elif path == "/audio.wav":
+            self._send(
+                self.wav,
+                "audio/wav",
+                {"Content-Disposition": 'attachment; filename="bench_overview.wav"'},
+            )
+        elif path.startswith("/pod/dashboard/episode/wizard"):
+            self._page("spotify_wizard.html", UPLOAD_MS_PER_MB=cfg.upload_ms_per_mb)
+        else:
+            self.send_error(404)
+
+
+class FixtureServer:
+    """Serve the fixtures on 127.0.0.1 from a background thread."""
+
+    def __init__(self, config: FixtureConfig | None = None, port: int = 0):
+        self.config = config or FixtureConfig()
+        wav = make_wav(self.config.audio_seconds)
+        handler = partial(FixtureHandler, self.config, wav)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self) -> dict[str, str]:
+        """Environment overrides that point every stage at this server."""
+        return {
+            "CHATGPT_BASE_URL": self.base_url,
+            "NOTEBOOKLM_URL": self.base_url,
+            "SPOTIFY_WIZARD_URL": f"{self.base_url}/pod/dashboard/episode/wizard",
+        }
+
+    def __enter__(self) -> "FixtureServer":
+        self._thread.start()
+        logger.info("Fixture server listening on %s", self.base_url)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,307 @@
+import logging
+import shutil
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+
+RUNS_DIR = Path.cwd() / "runs"
+STAGES = ("chatgpt", "notebooklm", "audio", "spotify")
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id     TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    status     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id      TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    started_at  REAL,
+    finished_at REAL,
+    error       TEXT,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id TEXT NOT NULL,
+    name   TEXT NOT NULL,
+    kind   TEXT NOT NULL,
+    value  TEXT NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS backfill_items (
+    backfill_id TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    message_id  TEXT NOT NULL,
+    run_id      TEXT NOT NULL,
+    publish_at  TEXT,
+    PRIMARY KEY (backfill_id, position)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    name   TEXT PRIMARY KEY,
+    due    REAL NOT NULL,
+    run_id TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS watch (
+    conversation TEXT PRIMARY KEY,
+    message_id   TEXT,
+    success_at   REAL
+);
+"""
+
+
+class RunStore:
+    """
+    Run-ID keyed artifact store: an SQLite index of runs, stage status and
+    outputs, plus a blob directory per run for files such as the audio.
+    """
+
+    def __init__(self, root: Path = RUNS_DIR):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db_path = root / "runs.sqlite"
+        with closing(self._connect()) as db, db:
+            db.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    def blob_dir(self, run_id: str) -> Path:
+        path = self.root / run_id
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    # ───────── runs ─────────
+    def new_run(self) -> str:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        run_id = f"{stamp}-{uuid.uuid4().hex[:6]}"
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT INTO runs VALUES (?, ?, 'running')", (run_id, time.time())
+            )
+        logger.info("🆔  Run %s started", run_id)
+        return run_id
+
+    def resolve(self, run_id: str) -> str:
+        """Return `run_id`, resolving "latest" to the most recent run."""
+        query = "SELECT run_id FROM runs WHERE run_id = ?"
+        args: tuple = (run_id,)
+        if run_id == "latest":
+            query, args = "SELECT run_id FROM runs ORDER BY created_at DESC LIMIT 1", ()
+        with closing(self._connect()) as db:
+            row = db.execute(query, args).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown run: {run_id}")
+        return row[0]
+
+    def set_run_status(self, run_id: str, status: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE runs SET status = ? WHERE run_id = ?", (status, run_id))
+
+    def run_info(self, run_id: str) -> dict:
+        """Return a run's status and per-stage status, timings and errors."""
+        run_id = self.resolve(run_id)
+        with closing(self._connect()) as db:
+            created_at, status = db.execute(
+                "SELECT created_at, status FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            rows = db.execute(
+                "SELECT stage, status, started_at, finished_at, error FROM stages "
+                "WHERE run_id = ?",
+                (run_id,),
+            ).fetchall()
+        stages = {
+            stage: {
+                "status": st,
+                "started_at": started,
+                "duration": finished - started if finished and started else None,
+                "error": error,
+            }
+            for stage, st, started, finished, error in rows
+        }
+        return {
+            "run_id": run_id,
+            "created_at": created_at,
+            "status": status,
+            "stages": {s: stages[s] for s in STAGES if s in stages},
+        }
+
+    def recent_runs(self, limit: int = 20) -> list[tuple[str, float, str]]:
+        """Return `(run_id, created_at, status)` of the newest runs."""
+        with closing(self._connect()) as db:
+            return db.execute(
+                "SELECT run_id, created_at, status FROM runs "
+                "ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    # ───────── stages ─────────
+    def start_stage(self, run_id: str, stage: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO stages VALUES (?, ?, 'running', ?, NULL, NULL)",
+                (run_id, stage, time.time()),
+            )
+
+    def finish_stage(self, run_id: str, stage: str, error: str | None = None) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "UPDATE stages SET status = ?, finished_at = ?, error = ? "
+                "WHERE run_id = ? AND stage = ?",
+                ("failed" if error else "done", time.time(), error, run_id, stage),
+            )
+
+    def stage_done(self, run_id: str, stage: str) -> bool:
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT status FROM stages WHERE run_id = ? AND stage = ?",
+                (run_id, stage),
+            ).fetchone()
+        return row is not None and row[0] == "done"
+
+    def first_incomplete(self, run_id: str) -> str | None:
+        return next((s for s in STAGES if not self.stage_done(run_id, s)), None)
+
+    def reset_stages(self, run_id: str, from_stage: str) -> None:
+        """
+        Forget `from_stage` and every later stage so a resume redoes them. A
+        failed stage keeps its row, so its error stays visible until it reruns.
+        """
+        later = STAGES[STAGES.index(from_stage) :]
+        with closing(self._connect()) as db, db:
+            db.executemany(
+                "DELETE FROM stages WHERE run_id = ? AND stage = ? "
+                "AND status != 'failed'",
+                [(run_id, stage) for stage in later],
+            )
+
+    # ───────── artifacts ─────────
+    def put_text(self, run_id: str, name: str, value: str | None) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, 'text', ?)",
+                (run_id, name, value or ""),
+            )
+
+    def put_file(self, run_id: str, name: str, path: Path) -> Path:
+        """Move `path` into the run's blob dir and record it; returns the new path."""
+        target = self.blob_dir(run_id) / f"{name}{path.suffix}"
+        shutil.move(path, target)
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, 'file', ?)",
+                (run_id, name, str(target)),
+            )
+        return target
+
+    def get(self, run_id: str, name: str) -> str | None:
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT value FROM artifacts WHERE run_id = ? AND name = ?",
+                (run_id, name),
+            ).fetchone()
+        return row[0] if row else None
+
+    def run_for_message(self, message_id: str) -> tuple[str, str] | None:
+        """Return `(run_id, status)` of the run that handled a ChatGPT message."""
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT r.run_id, r.status FROM artifacts a JOIN runs r USING (run_id) "
+                "WHERE a.name = 'message_id' AND a.value = ? "
+                "ORDER BY r.created_at DESC LIMIT 1",
+                (message_id,),
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def latest(self, name: str) -> str | None:
+        """Return the newest value of artifact `name` across all runs."""
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT a.value FROM artifacts a JOIN runs r USING (run_id) "
+                "WHERE a.name = ? ORDER BY r.created_at DESC LIMIT 1",
+                (name,),
+            ).fetchone()
+        return row[0] if row else None
+
+    # ───────── scheduled jobs ─────────
+    def job_state(self, name: str) -> tuple[float, str, str] | None:
+        """Return `(due, run_id, status)` of the last occurrence of job `name`."""
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT due, run_id, status FROM jobs WHERE name = ?", (name,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def set_job_state(self, name: str, due: float, run_id: str, status: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)",
+                (name, due, run_id, status),
+            )
+
+    # ───────── watch mode ─────────
+    def watch_state(self, conversation: str) -> tuple[str | None, float | None]:
+        """
+        Return `(message_id, success_at)` for a watched conversation: the last
+        reply the watcher handled or skipped, and when a run last succeeded.
+        """
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT message_id, success_at FROM watch WHERE conversation = ?",
+                (conversation,),
+            ).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def set_watch_message(self, conversation: str, message_id: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT INTO watch (conversation, message_id) VALUES (?, ?) "
+                "ON CONFLICT (conversation) DO UPDATE SET message_id = ?",
+                (conversation, message_id, message_id),
+            )
+
+    def set_watch_success(self, conversation: str, at: float) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT INTO watch (conversation, success_at) VALUES (?, ?) "
+                "ON CONFLICT (conversation) DO UPDATE SET success_at = ?",
+                (conversation, at, at),
+            )
+
+    # ───────── backfills ─────────
+    def add_backfill_item(
+        self,
+        backfill_id: str,
+        position: int,
+        message_id: str,
+        run_id: str,
+        publish_at: str | None,
+    ) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT INTO backfill_items VALUES (?, ?, ?, ?, ?)",
+                (backfill_id, position, message_id, run_id, publish_at),
+            )
+
+    def backfill_items(self, backfill_id: str) -> list[tuple[str, str, str | None]]:
+        """Return `(message_id, run_id, publish_at)` in publishing order."""
+        with closing(self._connect()) as db:
+            return db.execute(
+                "SELECT message_id, run_id, publish_at FROM backfill_items "
+                "WHERE backfill_id = ? ORDER BY position",
+                (backfill_id,),
+            ).fetchall()
+
+    def latest_backfill(self) -> str | None:
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT backfill_id FROM backfill_items "
+                "ORDER BY backfill_id DESC LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,373 @@
+import argparse
+import logging
+import math
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import wave
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from metrics import span
+
+CHUNK_FRAMES = 1 << 20  # ~24 s at 44.1 kHz; bounds memory for any file length
+WINDOW_S = 0.05  # silence is judged per 50 ms window
+SILENCE_DBFS = -50.0
+EDGE_PAD_S = 0.5  # silence kept before / after the content when trimming
+PEAK_CEILING_DBFS = -1.0
+TRANSCODE_ARGS = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "128k"],
+    "m4a": ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"],
+}
+
+# WAV format tag / bits → (numpy dtype, full scale, zero offset)
+_PCM = {
+    (1, 8): ("u1", 128.0, 128.0),
+    (1, 16): ("<i2", 32768.0, 0.0),
+    (1, 32): ("<i4", 2.0**31, 0.0),
+    (3, 32): ("<f4", 1.0, 0.0),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class AudioValidationError(RuntimeError):
+    """Raised when a download is unfit to publish (truncated, silent, short)."""
+
+
+@dataclass
+class AudioReport:
+    path: str
+    duration_s: float
+    sample_rate: int
+    channels: int
+    rms_dbfs: float
+    peak_dbfs: float
+    leading_silence_s: float
+    trailing_silence_s: float
+    longest_silence_s: float  # between the first and last non-silent window
+    silent_ratio: float
+    truncated: bool = False
+
+
+@dataclass
+class AudioLimits:
+    min_duration_s: float = 20.0
+    min_rms_dbfs: float = -45.0
+    max_silence_s: float = 8.0
+    max_silent_ratio: float = 0.3
+
+    @classmethod
+    def from_env(cls) -> "AudioLimits":
+        """Override any limit with e.g. AUDIO_MIN_DURATION_S in the .env."""
+        load_dotenv()
+        return cls(
+            **{
+                name: float(os.getenv(f"AUDIO_{name.upper()}", default))
+                for name, default in asdict(cls()).items()
+            }
+        )
+
+
+def _dbfs(value: float) -> float:
+    return 20 * math.log10(max(value, 1e-10))
+
+
+def ffmpeg() -> str | None:
+    return shutil.which("ffmpeg")
+
+
+# ───────── decoding ─────────
+def _wav_layout(path: Path) -> tuple[int, int, int, int, int, int]:
+    """Return `(format_tag, channels, rate, bits, data_offset, data_bytes)`."""
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise AudioValidationError(f"{path.name} is not a WAV file")
+        fmt = None
+        while len(chunk := f.read(8)) == 8:
+            chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if chunk_id == b"fmt ":
+                body = f.read(size + (size & 1))
+                tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if tag == 0xFFFE and len(body) >= 26:  # WAVE_FORMAT_EXTENSIBLE
+                    tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (tag, channels, rate, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise AudioValidationError(f"{path.name}: data before fmt chunk")
+                return (*fmt, f.tell(), size)
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+    raise AudioValidationError(f"{path.name} has no audio data (truncated?)")
+
+
+def _needs_ffmpeg(path: Path) -> bool:
+    """True if `path` is not a PCM/float WAV that NumPy can read directly."""
+    if path.suffix.lower() != ".wav":
+        return True
+    tag, _, _, bits, _, _ = _wav_layout(path)
+    return (tag, bits) not in _PCM
+
+
+def _decode_with_ffmpeg(path: Path, out_dir: Path) -> Path:
+    exe = ffmpeg()
+    if exe is None:
+        raise AudioValidationError(f"ffmpeg is needed to decode {path.suffix} files")
+    target = out_dir / f"{path.stem}.decoded.wav"
+    subprocess.run(
+        [exe, "-v", "error", "-y", "-i", str(path), "-c:a", "pcm_s16le", str(target)],
+        check=True,
+        capture_output=True,
+    )
+    return target
+
+
+def _open_pcm(path: Path, scratch: Path) -> tuple[np.memmap, int, float, float, bool]:
+    """Memory-map the PCM samples of `path`, decoding it to WAV first if needed."""
+    if path.suffix.lower() != ".wav":
+        path = _decode_with_ffmpeg(path, scratch)
+    tag, channels, rate, bits, offset, size = _wav_layout(path)
+    if (tag, bits) not in _PCM:
+        return _open_pcm(_decode_with_ffmpeg(path, scratch), scratch)
+    dtype, scale, zero = _PCM[(tag, bits)]
+    available = path.stat().st_size - offset
+    truncated = size != 0xFFFFFFFF and available < size  # streamed WAVs say 0xFFFFFFFF
+    frames = min(size, available) // (channels * bits // 8)
+    samples = np.memmap(
+        path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels)
+    )
+    return samples, rate, scale, zero, truncated
+
+
+# ───────── analysis ─────────
+def analyze(
+    path: Path, chunk_frames: int = CHUNK_FRAMES, silence_dbfs: float = SILENCE_DBFS
+) -> AudioReport:
+    """
+    Measure duration, RMS, peak and silence runs of `path`.
+
+    Samples are memory-mapped and processed `chunk_frames` at a time with
+    vectorised NumPy, so memory stays flat for hour-long episodes.
+    """
+    with tempfile.TemporaryDirectory(prefix="audio-") as scratch:
+        samples, rate, scale, zero, truncated = _open_pcm(path, Path(scratch))
+        frames, channels = samples.shape
+        window = max(1, int(rate * WINDOW_S))
+        chunk_frames = max(window, chunk_frames // window * window)
+        threshold = 10 ** (silence_dbfs / 20)
+
+        sum_sq, peak = 0.0, 0.0
+        windows = silent_windows = 0
+        leading = run = longest = 0
+        seen_sound = False
+        for start in range(0, frames, chunk_frames):
+            block = samples[start : start + chunk_frames].astype(np.float32)
+            mono = (block.mean(axis=1) - zero) / scale
+            sum_sq += float(np.dot(mono.astype(np.float64), mono))
+            peak = max(peak, float(np.abs(mono).max(initial=0.0)))
+
+            usable = len(mono) // window * window
+            rms = np.sqrt(np.square(mono[:usable]).reshape(-1, window).mean(axis=1))
+            silent = rms < threshold
+            windows += len(silent)
+            silent_windows += int(silent.sum())
+            loud = np.flatnonzero(~silent)
+            if len(loud) == 0:
+                run += len(silent)
+                continue
+            if seen_sound:
+                longest = max(longest, run + int(loud[0]))
+            else:
+                leading, seen_sound = run + int(loud[0]), True
+            if len(loud) > 1:
+                longest = max(longest, int((np.diff(loud) - 1).max()))
+            run = len(silent) - 1 - int(loud[-1])
+        del samples  # release the mapping before the scratch dir goes away
+
+    if not seen_sound:
+        leading, run = windows, 0
+    return AudioReport(
+        path=str(path),
+        duration_s=frames / rate if rate else 0.0,
+        sample_rate=rate,
+        channels=channels,
+        rms_dbfs=_dbfs(math.sqrt(sum_sq / frames)) if frames else _dbfs(0),
+        peak_dbfs=_dbfs(peak),
+        leading_silence_s=leading * window / rate,
+        trailing_silence_s=run * window / rate,
+        longest_silence_s=longest * window / rate,
+        silent_ratio=silent_windows / windows if windows else 1.0,
+        truncated=truncated,
+    )
+
+
+def validate(report: AudioReport, limits: AudioLimits | None = None) -> None:
+    """Raise AudioValidationError if the report shows an unpublishable file."""
+    limits = limits or AudioLimits.from_env()
+    problems = []
+    if report.truncated:
+        problems.append("the download is truncated")
+    if report.duration_s < limits.min_duration_s:
+        problems.append(f"only {report.duration_s:.1f} s long")
+    if report.rms_dbfs < limits.min_rms_dbfs:
+        problems.append(f"too quiet ({report.rms_dbfs:.1f} dBFS RMS)")
+    if report.longest_silence_s > limits.max_silence_s:
+        problems.append(f"{report.longest_silence_s:.1f} s of silence mid-episode")
+    if report.silent_ratio > limits.max_silent_ratio:
+        problems.append(f"{report.silent_ratio:.0%} silent")
+    if problems:
+        raise AudioValidationError(
+            f"Rejected {Path(report.path).name}: " + "; ".join(problems)
+        )
+
+
+# ───────── normalisation ─────────
+def _gain_db(report: AudioReport, target_dbfs: float | None) -> float:
+    if target_dbfs is None:
+        return 0.0
+    return min(target_dbfs - report.rms_dbfs, PEAK_CEILING_DBFS - report.peak_dbfs)
+
+
+def _edges(report: AudioReport, trim: bool) -> tuple[float, float]:
+    if not trim:
+        return 0.0, report.duration_s
+    start = max(0.0, report.leading_silence_s - EDGE_PAD_S)
+    end = report.duration_s - max(0.0, report.trailing_silence_s - EDGE_PAD_S)
+    return start, end
+
+
+def _process_numpy(
+    path: Path, report: AudioReport, gain_db: float, start_s: float, end_s: float
+) -> Path:
+    """Trim and apply gain chunk by chunk, writing a 16-bit WAV."""
+    target = path.with_name(f"{path.stem}.normalized.wav")
+    gain = 10 ** (gain_db / 20)
+    with tempfile.TemporaryDirectory(prefix="audio-") as scratch:
+        samples, rate, scale, zero, _ = _open_pcm(path, Path(scratch))
+        first, last = int(start_s * rate), int(end_s * rate)
+        with wave.open(str(target), "wb") as out:
+            out.setnchannels(samples.shape[1])
+            out.setsampwidth(2)
+            out.setframerate(rate)
+            for pos in range(first, last, CHUNK_FRAMES):
+                block = samples[pos : min(pos + CHUNK_FRAMES, last)]
+                scaled = (block.astype(np.float32) - zero) / scale * gain
+                pcm = np.clip(scaled * 32767, -32768, 32767).astype("<i2")
+                out.writeframes(pcm.tobytes())
+        del samples
+    return target
+
+
+def _process_ffmpeg(
+    path: Path, gain_db: float, start_s: float, end_s: float, fmt: str | None
+) -> Path:
+    suffix = f".{fmt}" if fmt else path.suffix
+    target = path.with_name(f"{path.stem}.normalized{suffix}")
+    filters = [f"atrim=start={start_s:.3f}:end={end_s:.3f}", f"volume={gain_db:.2f}dB"]
+    codec = TRANSCODE_ARGS.get(fmt, ["-c:a", "pcm_s16le"] if suffix == ".wav" else [])
+    subprocess.run(
+        [ffmpeg(), "-v", "error", "-y", "-i", str(path), "-af", ",".join(filters)]
+        + codec
+        + [str(target)],
+        check=True,
+        capture_output=True,
+    )
+    return target
+
+
+def prepare(
+    path: Path,
+    report: AudioReport,
+    target_dbfs: float | None = None,
+    trim: bool = False,
+    transcode: str | None = None,
+) -> Path:
+    """
+    Loudness-normalise to `target_dbfs` RMS (peaks stay below -1 dBFS), trim
+    leading/trailing silence and/or transcode; returns the file to upload.
+    Without ffmpeg, WAVs are processed in NumPy and transcoding is skipped.
+    """
+    gain_db = _gain_db(report, target_dbfs)
+    start_s, end_s = _edges(report, trim)
+    if abs(gain_db) < 0.1 and not transcode and end_s - start_s >= report.duration_s:
+        return path
+    if ffmpeg() is not None:
+        target = _process_ffmpeg(path, gain_db, start_s, end_s, transcode)
+    elif path.suffix.lower() == ".wav":
+        if transcode:
+            logger.warning("ffmpeg not found; uploading WAV instead of %s", transcode)
+        target = _process_numpy(path, report, gain_db, start_s, end_s)
+    else:
+        logger.warning("ffmpeg not found; uploading %s unprocessed", path.name)
+        return path
+    logger.info(
+        "🎚️  %s → %s (%+.1f dB, %.1f–%.1f s, %.1f → %.1f MB)",
+        path.name,
+        target.name,
+        gain_db,
+        start_s,
+        end_s,
+        path.stat().st_size / 1e6,
+        target.stat().st_size / 1e6,
+    )
+    path.unlink()
+    return target
+
+
+def options_from_env() -> dict:
+    """AUDIO_NORMALIZE_DBFS, AUDIO_TRIM and AUDIO_TRANSCODE (mp3 / m4a)."""
+    load_dotenv()
+    target = os.getenv("AUDIO_NORMALIZE_DBFS")
+    return {
+        "target_dbfs": float(target) if target else None,
+        "trim": os.getenv("AUDIO_TRIM", "0").strip().lower() in ("1", "true"),
+        "transcode": os.getenv("AUDIO_TRANSCODE") or None,
+    }
+
+
+def check_and_prepare(path: Path, **options) -> Path:
+    """Validate `path` and return the (optionally processed) file to upload."""
+    if ffmpeg() is None and _needs_ffmpeg(path):  # e.g. MP3 or 24-bit WAV
+        logger.warning("ffmpeg not found; cannot check %s before upload", path.name)
+        return path
+    with span("audio.analyze") as attrs:
+        report = analyze(path)
+        attrs.update(duration_s=round(report.duration_s, 1), bytes=path.stat().st_size)
+    logger.info(
+        "🔊  %s: %.1f s, %.1f dBFS RMS, %.1f dBFS peak, %.0f%% silent",
+        path.name,
+        report.duration_s,
+        report.rms_dbfs,
+        report.peak_dbfs,
+        report.silent_ratio * 100,
+    )
+    validate(report)
+    with span("audio.prepare") as attrs:
+        path = prepare(path, report, **(options or options_from_env()))
+        attrs["bytes"] = path.stat().st_size
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Analyse and validate an episode")
+    parser.add_argument("path", type=Path)
+    args = parser.parse_args()
+    report = analyze(args.path)
+    for key, value in asdict(report).items():
+        print(f"{key:<20} {value}")
+    try:
+        validate(report)
+        print("OK")
+    except AudioValidationError as e:
+        print(e)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
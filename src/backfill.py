@@ -0,0 +1,239 @@
+"""
+Publish a batch of historical ChatGPT replies in one go.
+
+    python src/backfill.py --last 5
+    python src/backfill.py --since 2026-10-01 --first-publish 2026-10-20T05:00
+    python src/backfill.py --resume latest
+
+Every reply becomes its own run (ChatGPT stage already satisfied) with a
+scheduled publish date; progress lives in the run store, so an interrupted
+backfill resumes at the first unfinished run.
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import logging
+import sys
+import time
+
+from artifacts import RunStore
+from chatgpt_pull import AssistantMessage, conversation_id, fetch_assistant_messages
+from notebooklm_gen import GenerationQueue
+from pipeline import (
+    BatchResult,
+    Run,
+    StageTimer,
+    execute,
+    new_run_for_message,
+    open_run,
+)
+from utils import BrowserPool
+
+UTC = dt.timezone.utc
+WORKERS = 2  # notebooks generating at the same time
+
+logger = logging.getLogger(__name__)
+
+
+def select_messages(
+    messages: list[AssistantMessage],
+    last: int | None = None,
+    since: dt.datetime | None = None,
+) -> list[AssistantMessage]:
+    """Keep the last `last` messages and/or those created since `since`."""
+    if since is not None:
+        cutoff = since.timestamp()
+        messages = [m for m in messages if (m.create_time or 0) >= cutoff]
+    if last:
+        messages = messages[-last:]
+    return messages
+
+
+def next_publish_slot(now: dt.datetime | None = None) -> dt.datetime:
+    """The next 05:00 UTC, the usual daily publishing time."""
+    now = now or dt.datetime.now(UTC)
+    slot = now.replace(hour=5, minute=0, second=0, microsecond=0)
+    return slot if slot > now else slot + dt.timedelta(days=1)
+
+
+async def plan_backfill(
+    store: RunStore,
+    pool: BrowserPool,
+    last: int | None = None,
+    since: dt.datetime | None = None,
+    first_publish: dt.datetime | None = None,
+    every: dt.timedelta = dt.timedelta(days=1),
+    cid: str | None = None,
+    show: str | None = None,
+) -> str | None:
+    """
+    Create one run per selected reply not handled before, oldest first, with
+    publish dates `every` apart starting at `first_publish`. Returns the
+    backfill ID, or None if there is nothing to do.
+    """
+    cid = cid or conversation_id()
+    messages = select_messages(await fetch_assistant_messages(pool, cid), last, since)
+    fresh = [m for m in messages if store.run_for_message(m.id) is None]
+    logger.info(
+        "📚  %d replies selected, %d already published or in progress",
+        len(messages),
+        len(messages) - len(fresh),
+    )
+    if not fresh:
+        return None
+
+    backfill_id = "bf-" + dt.datetime.now(UTC).strftime("%Y%m%dT%H%M%S")
+    publish_at = first_publish or next_publish_slot()
+    position = 0
+    for message in fresh:
+        try:
+            run_id = new_run_for_message(store, message.id, message.markdown)
+        except ValueError as e:
+            logger.warning("Skipping reply %s without a JSON block: %s", message.id, e)
+            continue
+        store.put_text(run_id, "conversation_id", cid)
+        if show:
+            store.put_text(run_id, "show", show)
+        store.put_text(run_id, "publish_at", publish_at.isoformat())
+        store.add_backfill_item(
+            backfill_id, position, message.id, run_id, publish_at.isoformat()
+        )
+        publish_at += every
+        position += 1
+    if not position:
+        return None
+    logger.info("🗂️  Backfill %s planned with %d episodes", backfill_id, position)
+    return backfill_id
+
+
+async def run_backfill(
+    store: RunStore, backfill_id: str, pool: BrowserPool, workers: int = WORKERS
+) -> BatchResult:
+    """
+    Finish every run of a backfill: notebooks generate `workers` at a time and
+    uploads go one after another through the pooled Spotify browser.
+    """
+    items = store.backfill_items(backfill_id)
+    pending = [
+        (message_id, run_id)
+        for message_id, run_id, _ in items
+        if store.first_incomplete(run_id) is not None
+    ]
+    logger.info(
+        "▶️  Backfill %s: %d/%d episodes done, %d to go",
+        backfill_id,
+        len(items) - len(pending),
+        len(items),
+        len(pending),
+    )
+    notebooklm_queue = GenerationQueue(workers)
+    spotify_slots = asyncio.Semaphore(1)
+    result = BatchResult()
+    started = time.perf_counter()
+
+    async def episode(message_id: str, run_id: str) -> None:
+        run_id, conversation, show = open_run(store, run_id)
+        result.runs[message_id] = run_id
+        run = Run(
+            run_id,
+            store,
+            pool,
+            StageTimer(),
+            conversation,
+            show,
+            notebooklm_queue,
+            spotify_slots,
+        )
+        try:
+            await execute(run)
+            logger.info("✅  Backfill episode %s published", run_id)
+        except Exception as e:
+            result.failed[message_id] = repr(e)
+
+    await asyncio.gather(*(episode(m, r) for m, r in pending))
+    result.wall_s = time.perf_counter() - started
+    logger.info(
+        "📦  Backfill %s: %d/%d episodes in %.1f s (%.1f episodes/hour)",
+        backfill_id,
+        len(result.runs) - len(result.failed),
+        len(pending),
+        result.wall_s,
+        result.episodes_per_hour,
+    )
+    for message_id, error in result.failed.items():
+        logger.error("Episode for message %s failed: %s", message_id, error)
+    if result.failed:
+        logger.error("Resume with: backfill.py --resume %s", backfill_id)
+    return result
+
+
+async def backfill(args: argparse.Namespace) -> bool:
+    store = RunStore()
+    pool = BrowserPool()
+    try:
+        if args.resume:
+            backfill_id = (
+                store.latest_backfill() if args.resume == "latest" else args.resume
+            )
+            if not backfill_id or not store.backfill_items(backfill_id):
+                raise SystemExit(f"Unknown backfill: {args.resume}")
+        else:
+            backfill_id = await plan_backfill(
+                store,
+                pool,
+                last=args.last,
+                since=args.since,
+                first_publish=args.first_publish,
+                every=dt.timedelta(hours=args.every_hours),
+                cid=args.conversation,
+                show=args.show,
+            )
+            if backfill_id is None:
+                return True
+        result = await run_backfill(store, backfill_id, pool, args.workers)
+        return not result.failed
+    finally:
+        await pool.close()
+
+
+def _utc(value: str) -> dt.datetime:
+    when = dt.datetime.fromisoformat(value)
+    return when if when.tzinfo else when.replace(tzinfo=UTC)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    which = parser.add_mutually_exclusive_group(required=True)
+    which.add_argument("--last", type=int, metavar="N", help="The last N replies")
+    which.add_argument(
+        "--since", type=_utc, metavar="DATE", help="Replies since DATE (UTC)"
+    )
+    which.add_argument(
+        "--resume", metavar="BACKFILL_ID", help="Resume a backfill (or 'latest')"
+    )
+    parser.add_argument(
+        "--first-publish",
+        type=_utc,
+        metavar="DATETIME",
+        help="Publish date of the oldest reply (default: next 05:00 UTC)",
+    )
+    parser.add_argument(
+        "--every-hours",
+        type=float,
+        default=24,
+        help="Hours between scheduled episodes (default: %(default)s)",
+    )
+    parser.add_argument("--conversation", help="Default: conversation_id in .env")
+    parser.add_argument("--show", help="Spotify show ID (default: dashboard show)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s"
+    )
+    return 0 if asyncio.run(backfill(args)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
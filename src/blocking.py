@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from zendriver import cdp
+
+BLOCKLIST_FILE = Path.cwd() / "blocklist.json"
+
+# Resources none of our selectors need. Patterns use CDP's `*` wildcards.
+# NotebookLM keeps its fonts: Material icon ligatures carry button text.
+_MEDIA = ["*.mp4", "*.webm", "*.m3u8"]
+_IMAGES = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.ico"]
+_FONTS = ["*.woff", "*.woff2", "*.ttf", "*.otf"]
+_TELEMETRY = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*sentry.io*",
+    "*datadoghq.com*",
+    "*segment.io*",
+    "*hotjar.com*",
+]
+DEFAULT_POLICIES: dict[str, list[str]] = {
+    "chatgpt": _MEDIA
+    + _IMAGES
+    + _FONTS
+    + _TELEMETRY
+    + ["*/ces/v1/*", "*featuregates.org*", "*statsig*", "*intercom*"],
+    "notebooklm": _MEDIA + _IMAGES + _TELEMETRY + ["*play.google.com/log*"],
+    "spotify": _MEDIA
+    + _IMAGES
+    + _FONTS
+    + _TELEMETRY
+    + ["*gabo-receiver-service*", "*/event-service/*"],
+}
+
+logger = logging.getLogger(__name__)
+
+
+def blocking_enabled() -> bool:
+    load_dotenv()
+    return os.getenv("RESOURCE_BLOCKING", "1").strip().lower() not in ("0", "false")
+
+
+def policy_for(profile_name: str) -> list[str]:
+    """
+    Return the blocked-URL patterns for a profile.
+
+    `blocklist.json` may override a profile's list, e.g.
+    `{"chatgpt": ["*.png"], "spotify": []}`; an empty list disables blocking.
+    """
+    try:
+        overrides = json.loads(BLOCKLIST_FILE.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        overrides = {}
+    return overrides.get(profile_name, DEFAULT_POLICIES.get(profile_name, []))
+
+
+async def apply_blocking(tab, profile_name: str) -> int:
+    """Block the profile's resources in `tab`; returns the number of patterns."""
+    patterns = policy_for(profile_name) if blocking_enabled() else []
+    if not patterns:
+        return 0
+    await tab.send(cdp.network.enable())
+    await tab.send(cdp.network.set_blocked_ur_ls(urls=patterns))
+    logger.debug("Blocking %d URL patterns for %s", len(patterns), profile_name)
+    return len(patterns)
+
+
+# ───────── measurement ─────────
+async def measure_load(tab, url: str, settle_s: float = 2.0) -> dict:
+    """Load `url` and return bytes transferred, request counts and load time."""
+    from utils import wait_for_condition  # utils imports this module
+
+    stats = {"bytes": 0, "requests": 0, "blocked": 0}
+
+    def on_finished(event: cdp.network.LoadingFinished) -> None:
+        stats["requests"] += 1
+        stats["bytes"] += int(event.encoded_data_length)
+
+    def on_failed(event: cdp.network.LoadingFailed) -> None:
+        if event.blocked_reason is not None:
+            stats["blocked"] += 1
+
+    await tab.send(cdp.network.enable())
+    await tab.send(cdp.network.set_cache_disabled(cache_disabled=True))
+    tab.add_handler(cdp.network.LoadingFinished, on_finished)
+    tab.add_handler(cdp.network.LoadingFailed, on_failed)
+    try:
+        start = time.perf_counter()
+        await tab.get(url)
+        await wait_for_condition(
+            tab, "document.readyState === 'complete'", 60, label="page load"
+        )
+        stats["load_s"] = time.perf_counter() - start
+        await asyncio.sleep(settle_s)  # late XHR / telemetry
+    finally:
+        tab.remove_handlers(cdp.network.LoadingFinished, on_finished)
+        tab.remove_handlers(cdp.network.LoadingFailed, on_failed)
+    return stats
+
+
+async def measure(profiles: list[str], runs: int) -> None:
+    """Print bytes and load time per site with and without blocking."""
+    from chatgpt_pull import chatgpt_base_url
+    from notebooklm_gen import notebooklm_url
+    from spotify_upload import wizard_url
+    from utils import start_browser
+
+    urls = {
+        "chatgpt": f"{chatgpt_base_url()}/",
+        "notebooklm": notebooklm_url(),
+        "spotify": wizard_url(),
+    }
+    print(
+        f"{'site':<12} {'blocking':<9} {'MB':>8} {'requests':>9} "
+        f"{'blocked':>8} {'load s':>7}"
+    )
+    for profile in profiles:
+        browser = await start_browser(profile_name=profile)
+        try:
+            for blocked in (False, True):
+                samples = []
+                for _ in range(runs):
+                    tab = await browser.get("about:blank", new_tab=True)
+                    if blocked:
+                        await tab.send(cdp.network.enable())
+                        await tab.send(
+                            cdp.network.set_blocked_ur_ls(urls=policy_for(profile))
+                        )
+                    samples.append(await measure_load(tab, urls[profile]))
+                    await tab.close()
+                avg = {k: sum(s[k] for s in samples) / runs for k in samples[0]}
+                print(
+                    f"{profile:<12} {'on' if blocked else 'off':<9} "
+                    f"{avg['bytes'] / 1e6:>8.2f} {avg['requests']:>9.0f} "
+                    f"{avg['blocked']:>8.0f} {avg['load_s']:>7.2f}"
+                )
+        finally:
+            await browser.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure page weight and load time with and without blocking"
+    )
+    parser.add_argument(
+        "profiles", nargs="*", default=list(DEFAULT_POLICIES), metavar="PROFILE"
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.WARNING, format="%(asctime)s %(levelname)s: %(message)s"
+    )
+    asyncio.run(measure(args.profiles, args.runs))
+
+
+if __name__ == "__main__":
+    main()
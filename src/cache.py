@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import re
+import shutil
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from downloads import new_download_dir
+
+CACHE_DIR = Path.cwd() / "podcast_cache"
+MAX_BYTES = 2 * 1024**3  # 2 GB of cached audio
+MAX_AGE_S = 30 * 24 * 3600  # 30 days
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicatePublishError(RuntimeError):
+    """Raised when an episode for the same content was already published."""
+
+
+def normalize_markdown(markdown: str) -> str:
+    """Normalise whitespace so cosmetic differences hash identically."""
+    lines = [line.rstrip() for line in markdown.replace("\r\n", "\n").split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def content_hash(markdown: str) -> str:
+    return hashlib.sha256(normalize_markdown(markdown).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    title: str
+    summary: str
+    audio_file: str  # name inside CACHE_DIR
+    size: int
+    created_at: float
+    published_at: float | None = None
+
+
+class PodcastCache:
+    """
+    Persistent map of reply-content hash → generated audio, title and summary.
+
+    Entries are evicted when older than `max_age_s`, and oldest-first once the
+    cached audio exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = CACHE_DIR,
+        max_bytes: int = MAX_BYTES,
+        max_age_s: float = MAX_AGE_S,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.index_path = cache_dir / "index.json"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _load(self) -> dict[str, CacheEntry]:
+        try:
+            raw = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {key: CacheEntry(**value) for key, value in raw.items()}
+
+    def _save(self, entries: dict[str, CacheEntry]) -> None:
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({k: asdict(v) for k, v in entries.items()}, indent=2),
+            encoding="utf-8",
+        )
+        tmp.replace(self.index_path)
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self._load().get(key)
+        if entry is None or not (self.cache_dir / entry.audio_file).is_file():
+            return None
+        return entry
+
+    def checkout(self, entry: CacheEntry) -> Path:
+        """Copy the cached audio into a fresh download dir (uploads delete it)."""
+        target = new_download_dir("cache-") / entry.audio_file
+        shutil.copy2(self.cache_dir / entry.audio_file, target)
+        return target
+
+    def put(self, key: str, title: str, summary: str, audio_path: Path) -> CacheEntry:
+        audio_file = f"{key[:16]}{audio_path.suffix}"
+        shutil.copy2(audio_path, self.cache_dir / audio_file)
+        entry = CacheEntry(
+            key=key,
+            title=title or "",
+            summary=summary or "",
+            audio_file=audio_file,
+            size=audio_path.stat().st_size,
+            created_at=time.time(),
+        )
+        entries = self._load()
+        entries[key] = entry
+        self._save(self._evict(entries))
+        logger.info("💾  Cached audio for %s…", key[:12])
+        return entry
+
+    def discard(self, key: str) -> None:
+        """Drop the entry for `key`, e.g. because its audio failed validation."""
+        entries = self._load()
+        if (entry := entries.pop(key, None)) is not None:
+            (self.cache_dir / entry.audio_file).unlink(missing_ok=True)
+            self._save(entries)
+            logger.info("🧹  Dropped cached audio %s", entry.audio_file)
+
+    def is_published(self, key: str) -> bool:
+        entry = self._load().get(key)
+        return entry is not None and entry.published_at is not None
+
+    def mark_published(self, key: str) -> None:
+        entries = self._load()
+        if key in entries:
+            entries[key].published_at = time.time()
+            self._save(entries)
+
+    def _evict(self, entries: dict[str, CacheEntry]) -> dict[str, CacheEntry]:
+        now = time.time()
+        keep = sorted(entries.values(), key=lambda e: e.created_at, reverse=True)
+        total, kept = 0, {}
+        for entry in keep:
+            too_old = now - entry.created_at > self.max_age_s
+            if too_old or total + entry.size > self.max_bytes:
+                (self.cache_dir / entry.audio_file).unlink(missing_ok=True)
+                logger.info("🧹  Evicted cached audio %s", entry.audio_file)
+                continue
+            total += entry.size
+            kept[entry.key] = entry
+        return kept
@@ -3,79 +3,328 @@ import json
 import logging
 import os
 import re
-import tempfile
 import time
-from pathlib import Path
-
-import zendriver as nodriver
+from dataclasses import dataclass
 
 # import nodriver
-# import nodriver.core.connection as ndc
-import zendriver.core.connection as ndc
+import zendriver as nodriver
 from dotenv import load_dotenv
 from markdownify import markdownify as md
 
-from utils import first_run_login, get_cookies_store, start_browser
+from artifacts import RunStore
+from metrics import record, span
+from utils import (
+    BrowserPool,
+    LoginRequiredError,
+    browser_session,
+    first_run_login,
+    get_cookies_store,
+    site_url,
+)
 
 
-async def get_html(tab: nodriver.Tab) -> str:
+# Resolves with the last bubble's HTML once ChatGPT stopped streaming: the stop
+# button is gone and either the turn's copy/regenerate actions rendered or the
+# content length stayed unchanged for `quiet_ms`. Resolves null at the deadline.
+FINAL_BUBBLE_JS = """
+new Promise((resolve) => {
+    const STOP = 'button[data-testid="stop-button"]';
+    const ACTIONS = '[data-testid="copy-turn-action-button"], '
+                  + '[data-testid="regenerate-turn-action-button"]';
+    let lastLen = -1, quiet = null, deadline = null;
+    const lastBox = () => {
+        const els = document.querySelectorAll('[data-message-author-role="assistant"]');
+        if (!els.length) return null;
+        const last = els[els.length - 1];
+        return last.querySelector('.markdown') || last;
+    };
+    const finish = (value) => {
+        obs.disconnect(); clearTimeout(quiet); clearTimeout(deadline); resolve(value);
+    };
+    const check = () => {
+        const box = lastBox();
+        if (!box || document.querySelector(STOP)) {
+            clearTimeout(quiet); quiet = null; lastLen = -1; return;
+        }
+        const turn = box.closest('article, [data-testid^="conversation-turn"]');
+        if (turn && turn.querySelector(ACTIONS)) return finish(box.innerHTML);
+        if (box.innerHTML.length !== lastLen) {
+            lastLen = box.innerHTML.length;
+            clearTimeout(quiet);
+            quiet = setTimeout(() => finish(lastBox().innerHTML), %(quiet_ms)d);
+        }
+    };
+    const obs = new MutationObserver(check);
+    obs.observe(document, {
+        childList: true, subtree: true, attributes: true, characterData: true,
+    });
+    deadline = setTimeout(() => finish(null), %(timeout_ms)d);
+    check();
+})
+"""
+
+
+@dataclass
+class FinalReply:
+    html: str
+    time_to_final: float  # seconds from attach to a settled message
+    reloads: int
 
-    async def html_of_last_bubble() -> str | None:
-        return await tab.evaluate(
-            """(() => {
-            const els = document.querySelectorAll('[data-message-author-role="assistant"]');
-            if (!els.length) return null;                      // not ready yet
-            const last = els[els.length - 1];
-            const box  = last.querySelector('.markdown') || last;
-            return box.innerHTML;
-        })()"""
-        )
 
-    html = None
-    while html is None:
-        if time.perf_counter() > time.perf_counter() + 60:  # 60‑second timeout
-            raise TimeoutError("No assistant message after 60 s")
+async def wait_for_final_reply(
+    tab: nodriver.Tab,
+    timeout_s: float = 300,
+    quiet_ms: int = 1500,
+    attempt_s: float = 90,
+    max_reloads: int = 2,
+) -> FinalReply:
+    """
+    Wait until the last assistant message has finished streaming.
+
+    Every attempt watches DOM mutations for up to `attempt_s`; if the page
+    never settles (or the context is destroyed) the tab is reloaded in place
+    and the observer reattached, without restarting Chrome.
+    """
+    start = time.perf_counter()
+    deadline = start + timeout_s
+    reloads = 0
+    while (remaining := deadline - time.perf_counter()) > 0:
+        budget = min(remaining, attempt_s)
         try:
-            html = await html_of_last_bubble()
-        except ndc.ProtocolException as e:
-            if "node with given id" in str(e):
-                # Page navigated → DOM id cache invalid; just retry
-                continue
-            raise
-        await asyncio.sleep(0.5)
+            html = await asyncio.wait_for(
+                tab.evaluate(
+                    FINAL_BUBBLE_JS
+                    % {"quiet_ms": quiet_ms, "timeout_ms": int(budget * 1000)},
+                    await_promise=True,
+                ),
+                timeout=budget + 1,
+            )
+        except Exception as e:
+            logging.debug("Completion watcher interrupted: %s", e)
+            html = None
 
-    return html
+        if html:
+            reply = FinalReply(html, time.perf_counter() - start, reloads)
+            record("chatgpt.wait_final", reply.time_to_final, retries=reloads)
+            logging.info(
+                "⏱️  Reply final after %.2f s (%d reloads)",
+                reply.time_to_final,
+                reply.reloads,
+            )
+            return reply
 
+        if reloads >= max_reloads:
+            break
+        reloads += 1
+        logging.warning(
+            "Reply not final yet; reloading tab (%d/%d)", reloads, max_reloads
+        )
+        await tab.reload()
 
-async def get_latest_reply() -> str:
-    profile_name = "chatgpt"
-    browser = await start_browser(headless=False, profile_name=profile_name)
-    tab = browser.main_tab
+    raise TimeoutError(f"Assistant reply did not finish streaming in {timeout_s}s")
 
-    cookie_store = get_cookies_store(profile_name)
 
-    await first_run_login(browser, tab, cookie_store, "https://chatgpt.com/auth/login")
+API_POLL_S = 5  # re-poll interval while the latest reply is still streaming
+API_FINAL_TIMEOUT_S = 300
 
-    # 2️⃣  Navigate to the conversation
-    # Get the conversation ID from the .env
-    load_dotenv()
-    cid = os.getenv("conversation_id")
-    logging.info("Using conversation ID: %s", cid)
-    await tab.get(f"https://chat.openai.com/c/{cid}")
+# In-page fetch that reuses the logged-in session's cookies and access token
+CONVERSATION_API_JS = """
+(async () => {
+    const session = await fetch('/api/auth/session', { credentials: 'include' })
+        .then((r) => r.json()).catch(() => ({}));
+    const headers = session.accessToken
+        ? { Authorization: 'Bearer ' + session.accessToken } : {};
+    const r = await fetch('/backend-api/conversation/' + %(cid)s, {
+        credentials: 'include', headers,
+    });
+    return JSON.stringify({
+        loggedIn: !!session.accessToken,
+        status: r.status,
+        body: r.ok ? await r.text() : null,
+    });
+})()
+"""
+
+
+def chatgpt_base_url() -> str:
+    return site_url("CHATGPT_BASE_URL", "https://chatgpt.com")
+
+
+@dataclass
+class AssistantMessage:
+    id: str
+    markdown: str
+    finished: bool  # False while the reply is still being generated
+    create_time: float | None = None  # epoch seconds
+
+
+def assistant_messages(conversation: dict) -> list[AssistantMessage]:
+    """
+    Return the assistant messages of a conversation payload, oldest first,
+    walking the message tree from `current_node` back to the root.
+    """
+    mapping = conversation["mapping"]
+    node_id = conversation.get("current_node")
+    messages = []
+    while node_id is not None:
+        node = mapping[node_id]
+        message = node.get("message") or {}
+        content = message.get("content") or {}
+        parts = [p for p in content.get("parts", []) if isinstance(p, str)]
+        if message.get("author", {}).get("role") == "assistant" and "".join(parts):
+            status = message.get("status", "finished_successfully")
+            messages.append(
+                AssistantMessage(
+                    id=message.get("id", node_id),
+                    markdown="".join(parts).strip(),
+                    finished=status == "finished_successfully",
+                    create_time=message.get("create_time"),
+                )
+            )
+        node_id = node.get("parent")
+    return messages[::-1]
+
+
+def latest_assistant_message(conversation: dict) -> AssistantMessage:
+    """Return the newest assistant message in a conversation payload."""
+    messages = assistant_messages(conversation)
+    if not messages:
+        raise ValueError("Conversation has no assistant message")
+    return messages[-1]
+
+
+async def open_api_origin(tab: nodriver.Tab) -> None:
+    """Load a cheap same-origin JSON document so fetch() runs with our cookies."""
+    with span("chatgpt.page_load", mode="api"):
+        await tab.get(f"{chatgpt_base_url()}/api/auth/session")
+
+
+async def fetch_conversation(tab: nodriver.Tab, cid: str) -> dict:
+    """Return the conversation JSON; the tab must be on the ChatGPT origin."""
+    with span("chatgpt.fetch_api") as attrs:
+        result = json.loads(
+            await tab.evaluate(
+                CONVERSATION_API_JS % {"cid": json.dumps(cid)}, await_promise=True
+            )
+        )
+        attrs["http_status"] = result["status"]
+    if not result["loggedIn"]:
+        raise LoginRequiredError("ChatGPT session expired; log in again")
+    if result["status"] != 200:
+        raise RuntimeError(f"Conversation API returned HTTP {result['status']}")
+    return json.loads(result["body"])
+
+
+async def fetch_reply_api(
+    tab: nodriver.Tab,
+    cid: str,
+    timeout_s: float = API_FINAL_TIMEOUT_S,
+    poll_s: float = API_POLL_S,
+) -> str:
+    """
+    Read the latest reply through the conversation JSON API (no SPA render).
+    A reply that is still being generated is polled again until its status
+    is `finished_successfully`; past `timeout_s` this raises TimeoutError.
+    """
+    await open_api_origin(tab)
+    start = time.perf_counter()
+    polls = 0
+    while True:
+        message = latest_assistant_message(await fetch_conversation(tab, cid))
+        if message.finished:
+            if polls:
+                record(
+                    "chatgpt.wait_final",
+                    time.perf_counter() - start,
+                    retries=polls,
+                    mode="api",
+                )
+            return message.markdown
+        if time.perf_counter() - start + poll_s > timeout_s:
+            raise TimeoutError(
+                f"Assistant reply did not finish streaming in {timeout_s}s"
+            )
+        polls += 1
+        logging.info("Reply still streaming; polling again in %.0f s", poll_s)
+        await asyncio.sleep(poll_s)
+
+
+async def fetch_assistant_messages(
+    pool: BrowserPool | None = None, cid: str | None = None
+) -> list[AssistantMessage]:
+    """Return every finished assistant message of conversation `cid`."""
+    cid = cid or conversation_id()
+    async with browser_session("chatgpt", pool) as (browser, tab):
+        await first_run_login(
+            browser,
+            tab,
+            get_cookies_store("chatgpt"),
+            f"{chatgpt_base_url()}/auth/login",
+        )
+        await open_api_origin(tab)
+        conversation = await fetch_conversation(tab, cid)
+    return [m for m in assistant_messages(conversation) if m.finished]
 
-    # 3️⃣  Poll the page every 500 ms until an assistant bubble exists
-    logging.info("Waiting for the latest reply...")
-    html = await get_html(tab)
-    # Could refresh the page if it takes too long or conversation could not be loaded
 
-    # 4️⃣  Convert HTML → Markdown
+async def fetch_reply_dom(tab: nodriver.Tab, cid: str) -> str:
+    """Render the conversation and convert the last assistant bubble."""
+    with span("chatgpt.page_load", mode="dom"):
+        await tab.get(f"{chatgpt_base_url()}/c/{cid}")
+
+    # Wait (DOM mutation driven) until the last reply stopped streaming
+    html = (await wait_for_final_reply(tab)).html
+
     logging.info("Converting HTML to Markdown...")
-    markdown = md(html, strip=["span"]).strip()
+    with span("chatgpt.markdownify", chars=len(html)):
+        return md(html, strip=["span"]).strip()
+
+
+async def get_latest_reply(
+    pool: BrowserPool | None = None, mode: str | None = None, cid: str | None = None
+) -> tuple[str, str | None, str | None]:
+    """
+    Fetch the latest reply of conversation `cid` (default: `conversation_id`
+    from the .env) as `(markdown, title, description)`. `mode` is "api"
+    (default, DOM as fallback) or "dom"; it can also be set with
+    CHATGPT_FETCH_MODE in the .env.
+    """
+    profile_name = "chatgpt"
+    cookie_store = get_cookies_store(profile_name)
+
+    cid = cid or conversation_id()
+    mode = mode or os.getenv("CHATGPT_FETCH_MODE", "api")
+    logging.info("Using conversation ID: %s (%s mode)", cid, mode)
+
+    async with browser_session(profile_name, pool) as (browser, tab):
+        await first_run_login(
+            browser, tab, cookie_store, f"{chatgpt_base_url()}/auth/login"
+        )
+
+        logging.info("Waiting for the latest reply...")
+        markdown = None
+        if mode == "api":
+            try:
+                markdown = await fetch_reply_api(tab, cid)
+            except LoginRequiredError:
+                raise  # scraping the DOM would not help either
+            except Exception as e:
+                logging.warning("Conversation API failed (%s); scraping the DOM", e)
+        if markdown is None:
+            markdown = await fetch_reply_dom(tab, cid)
+
     logging.info("Latest reply fetched successfully")
+    title, description = parse_reply(markdown)
+    return markdown, title, description
 
-    # Stop browser
-    await browser.stop()
 
+def conversation_id() -> str:
+    # Get the conversation ID from the .env
+    load_dotenv()
+    return os.getenv("conversation_id")
+
+
+def parse_reply(markdown: str) -> tuple[str | None, str | None]:
+    """Return the title and description from the reply's JSON block."""
     # try to capture a fenced ```json ... ``` block (tolerates "Copy code" noise)
     m = re.search(
         r"```(?:\s*json)?(?:\s*Copy code)?\s*(\{.*?\})\s*```",
@@ -91,15 +340,16 @@ async def get_latest_reply() -> str:
     description = data.get("description", None)
     logging.info("Latest reply title: %s", title)
     logging.info("Latest reply description: %s", description)
+    return title, description
 
-    # Save the results in /temp
-    temp_dir = Path(tempfile.gettempdir())
-    logging.info("Saving the latest reply to a temp location: %s", temp_dir)
-    (temp_dir / "latest_reply.md").write_text(markdown)
-    (temp_dir / "gpt_title.txt").write_text(title or "")
-    (temp_dir / "gpt_description.txt").write_text(description or "")
 
-    return markdown, title, description
+def record_chatgpt(
+    store: RunStore, run_id: str, markdown: str, title: str, description: str
+) -> None:
+    """Store the ChatGPT stage outputs for `run_id`."""
+    store.put_text(run_id, "markdown", markdown)
+    store.put_text(run_id, "gpt_title", title)
+    store.put_text(run_id, "gpt_description", description)
 
 
 if __name__ == "__main__":
@@ -111,4 +361,8 @@ if __name__ == "__main__":
     result = nodriver.loop().run_until_complete(get_latest_reply())
     print(result)
 
+    # Record the reply so `notebooklm_gen.py` can pick it up standalone
+    store = RunStore()
+    record_chatgpt(store, store.new_run(), *result)
+
     # In case of 409 error try via googling: chatGPT and then logging in
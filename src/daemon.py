@@ -0,0 +1,335 @@
+"""
+Keep the pipeline's browsers warm and take orders over a local HTTP API.
+
+    python src/daemon.py                          # http://127.0.0.1:8765
+    python src/daemon.py --socket runs/daemon.sock --schedule
+
+    curl -X POST localhost:8765/runs -d '{"conversation": "…", "show": "…"}'
+    curl -X POST localhost:8765/runs -d '{"run_id": "latest", "stage": "spotify"}'
+    curl localhost:8765/runs/<run_id>
+    curl -X DELETE localhost:8765/runs/<run_id>
+
+Runs go through the same pipeline and run store as `main.py`; the daemon only
+saves the process and browser start-up between them.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+
+from artifacts import STAGES, RunStore
+from jobs import JOBS_FILE, KEEP_WARM_INTERVAL_S, Scheduler, load_jobs
+from metrics import METRICS_DIR
+from pipeline import run_once
+from utils import BrowserPool
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BODY = 64 * 1024
+PROFILES = ("chatgpt", "notebooklm", "spotify")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Order:
+    """A run enqueued through the API."""
+
+    run_id: str
+    conversation: str | None = None
+    show: str | None = None
+    state: str = "queued"  # → running → done | failed | cancelled
+    enqueued_at: float = field(default_factory=time.time)
+    error: str | None = None
+    task: asyncio.Task | None = field(default=None, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.state in ("queued", "running")
+
+
+class Daemon:
+    """
+    Run enqueued pipelines against one warm browser pool, at most
+    `max_concurrent` at a time (scheduled jobs included, with `--schedule`).
+    """
+
+    def __init__(
+        self,
+        pool: BrowserPool | None = None,
+        store: RunStore | None = None,
+        max_concurrent: int = 1,
+    ):
+        self.pool = pool or BrowserPool()
+        self.store = store or RunStore()
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.orders: dict[str, Order] = {}
+
+    # ───────── runs ─────────
+    def enqueue(
+        self,
+        conversation: str | None = None,
+        show: str | None = None,
+        run_id: str | None = None,
+        stage: str | None = None,
+    ) -> Order:
+        """
+        Queue a new run, or resume `run_id` at its first incomplete stage. With
+        `stage`, that stage and every later one are redone.
+        """
+        if stage is not None:
+            if stage not in STAGES:
+                raise ValueError(f"stage must be one of {', '.join(STAGES)}")
+            if run_id is None:
+                raise ValueError("stage needs the run_id to redo it in")
+        if run_id is not None:
+            run_id = self.store.resolve(run_id)
+            if run_id in self.orders and self.orders[run_id].active:
+                raise ValueError(f"run {run_id} is already {self.orders[run_id].state}")
+            if stage is not None:
+                self.store.reset_stages(run_id, stage)
+                self.store.put_text(run_id, "publish_clicked", None)  # redo by hand
+            self.store.set_run_status(run_id, "running")
+        else:
+            run_id = self.store.new_run()
+        order = Order(run_id, conversation, show)
+        order.task = asyncio.create_task(self._execute(order))
+        self.orders[run_id] = order
+        logger.info("📥  Run %s queued", run_id)
+        return order
+
+    async def _execute(self, order: Order) -> None:
+        try:
+            async with self.slots:
+                order.state = "running"
+                try:
+                    await run_once(
+                        self.pool, order.run_id, order.conversation, order.show
+                    )
+                finally:
+                    await self.pool.end_run()
+            order.state = "done"
+        except asyncio.CancelledError:
+            order.state = "cancelled"
+            self.store.set_run_status(order.run_id, "cancelled")
+            logger.info("🛑  Run %s cancelled", order.run_id)
+        except Exception as e:
+            order.state, order.error = "failed", repr(e)
+            logger.exception("Run %s failed", order.run_id)
+
+    def cancel(self, run_id: str) -> Order:
+        order = self.orders.get(self.store.resolve(run_id))
+        if order is None or not order.active:
+            raise ValueError(f"run {run_id} is not queued or running")
+        order.task.cancel()
+        return order
+
+    def status(self, run_id: str) -> dict:
+        """The run's stages from the store, plus live state and metric spans."""
+        info = self.store.run_info(run_id)
+        now = time.time()
+        for stage in info["stages"].values():
+            if stage["status"] == "running":
+                stage["elapsed"] = now - stage["started_at"]
+        order = self.orders.get(info["run_id"])
+        if order is not None:
+            info.update(state=order.state, error=order.error)
+            if order.state == "queued":
+                info["queued_for"] = now - order.enqueued_at
+        try:
+            spans = json.loads(
+                (METRICS_DIR / f"{info['run_id']}.json").read_text(encoding="utf-8")
+            )["spans"]
+            info["spans"] = [
+                {k: s[k] for k in ("name", "start", "duration", "status")}
+                for s in spans
+            ]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+        return info
+
+    def runs(self, limit: int = 20) -> list[dict]:
+        return [
+            {
+                "run_id": run_id,
+                "created_at": created_at,
+                "status": status,
+                "state": self.orders[run_id].state if run_id in self.orders else None,
+            }
+            for run_id, created_at, status in self.store.recent_runs(limit)
+        ]
+
+    def health(self) -> dict:
+        states = [o.state for o in self.orders.values()]
+        return {
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "browsers": self.pool.status(),
+        }
+
+    async def warm_up(self) -> None:
+        """Start every browser now so the first run skips the launch."""
+        for profile_name in PROFILES:
+            try:
+                await self.pool.acquire(profile_name)
+            except Exception as e:
+                logger.warning("Could not warm up %s browser: %r", profile_name, e)
+
+    async def keep_warm(self) -> None:
+        while True:
+            await asyncio.sleep(KEEP_WARM_INTERVAL_S)
+            await self.pool.keep_warm()
+
+    async def shutdown(self) -> None:
+        active = [o.task for o in self.orders.values() if o.active]
+        for task in active:
+            task.cancel()
+        await asyncio.gather(*active, return_exceptions=True)
+        await self.pool.close()
+
+    # ───────── HTTP ─────────
+    def route(self, method: str, path: str, body: dict) -> tuple[HTTPStatus, object]:
+        parts = [p for p in path.split("?", 1)[0].split("/") if p]
+        if parts == ["health"] and method == "GET":
+            return HTTPStatus.OK, self.health()
+        if parts == ["runs"] and method == "GET":
+            return HTTPStatus.OK, self.runs()
+        if parts == ["runs"] and method == "POST":
+            order = self.enqueue(
+                body.get("conversation"),
+                body.get("show"),
+                body.get("run_id"),
+                body.get("stage"),
+            )
+            return HTTPStatus.ACCEPTED, {"run_id": order.run_id, "state": order.state}
+        if len(parts) == 2 and parts[0] == "runs" and method == "GET":
+            return HTTPStatus.OK, self.status(parts[1])
+        if len(parts) == 2 and parts[0] == "runs" and method == "DELETE":
+            order = self.cancel(parts[1])
+            return HTTPStatus.ACCEPTED, {"run_id": order.run_id, "state": "cancelling"}
+        return HTTPStatus.NOT_FOUND, {"error": f"no route for {method} {path}"}
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve one HTTP/1.1 request with a JSON body, then close."""
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            if length > MAX_BODY:
+                raise ValueError("request body too large")
+            raw = await reader.readexactly(length) if length else b""
+            body = json.loads(raw) if raw.strip() else {}
+            if not isinstance(body, dict):
+                raise ValueError("request body must be a JSON object")
+            code, payload = self.route(method.upper(), path, body)
+        except KeyError as e:
+            code, payload = HTTPStatus.NOT_FOUND, {"error": e.args[0]}
+        except ValueError as e:  # includes malformed request lines and JSON
+            code, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            logger.exception("API request failed")
+            code, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(e)}
+        data = json.dumps(payload, indent=2).encode() + b"\n"
+        writer.write(
+            f"HTTP/1.1 {code.value} {code.phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + data
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass  # the client hung up
+        finally:
+            writer.close()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    daemon = Daemon(max_concurrent=args.max_concurrent)
+    if args.socket:
+        args.socket.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(daemon.handle, args.socket)
+        os.chmod(args.socket, 0o600)
+        where = str(args.socket)
+    else:
+        server = await asyncio.start_server(daemon.handle, args.host, args.port)
+        where = f"http://{args.host}:{args.port}"
+
+    loops = [asyncio.create_task(server.serve_forever())]
+    if args.schedule:  # the scheduler health-checks the pool itself
+        scheduler = Scheduler(
+            load_jobs(args.jobs), daemon.pool, store=daemon.store, slots=daemon.slots
+        )
+        loops.append(asyncio.create_task(scheduler.run()))
+    else:
+        loops.append(asyncio.create_task(daemon.keep_warm()))
+
+    main_task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)
+    logger.info("🛰️  Daemon listening on %s", where)
+    try:
+        if not args.cold:
+            await daemon.warm_up()
+        await asyncio.gather(*loops)
+    finally:
+        server.close()
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        await daemon.shutdown()
+        if args.socket:
+            args.socket.unlink(missing_ok=True)
+        logger.info("Daemon stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument(
+        "--socket", type=Path, help="Listen on this Unix socket instead of TCP"
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Cap on pipelines running at the same time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--schedule",
+        action="store_true",
+        help="Also run the scheduled jobs from --jobs in this process",
+    )
+    parser.add_argument("--jobs", type=Path, default=JOBS_FILE)
+    parser.add_argument(
+        "--cold",
+        action="store_true",
+        help="Start browsers on the first run instead of right away",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s"
+    )
+    try:
+        asyncio.run(serve(args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
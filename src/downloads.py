@@ -0,0 +1,172 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterable
+
+from zendriver import cdp
+
+DOWNLOAD_ROOT = Path(tempfile.gettempdir()) / "podcast_downloads"
+LAST_DOWNLOAD = DOWNLOAD_ROOT / "last_download.txt"
+AUDIO_EXTS = (".wav", ".m4a", ".mp3")
+
+logger = logging.getLogger(__name__)
+
+
+def new_download_dir(prefix: str = "run-") -> Path:
+    """Create a fresh, private download directory for one run."""
+    DOWNLOAD_ROOT.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=prefix, dir=DOWNLOAD_ROOT))
+
+
+def last_download() -> Path | None:
+    """Return the file produced by the most recent completed download, if any."""
+    try:
+        path = Path(LAST_DOWNLOAD.read_text(encoding="utf-8").strip())
+    except FileNotFoundError:
+        return None
+    return path if path.is_file() else None
+
+
+class InotifyWatcher:
+    """Resolve when a file with a wanted extension is closed/moved into a dir."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_NONBLOCK = 0o4000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, dir_path: Path, exts: Iterable[str] = AUDIO_EXTS):
+        self.dir_path = dir_path
+        self.exts = tuple(exts)
+        self._fd: int | None = None
+        self.done: asyncio.Future | None = None
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux") and bool(ctypes.util.find_library("c"))
+
+    def start(self) -> "InotifyWatcher":
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(self.IN_NONBLOCK)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO
+        if libc.inotify_add_watch(fd, os.fsencode(self.dir_path), mask) < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+        self._fd = fd
+        loop = asyncio.get_running_loop()
+        self.done = loop.create_future()
+        loop.add_reader(fd, self._on_readable)
+        return self
+
+    def _on_readable(self) -> None:
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buf):
+            _, _, _, name_len = self._EVENT.unpack_from(buf, offset)
+            offset += self._EVENT.size
+            name = buf[offset : offset + name_len].rstrip(b"\0").decode()
+            offset += name_len
+            if name.lower().endswith(self.exts) and not self.done.done():
+                self.done.set_result(self.dir_path / name)
+
+    def stop(self) -> None:
+        if self._fd is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = None
+
+
+class DownloadWatcher:
+    """
+    Route a tab's downloads into a private directory and await the exact file.
+
+    Completion comes from CDP `Browser.downloadProgress` events; an inotify
+    watch on the directory is armed alongside as a fallback.
+    """
+
+    def __init__(self, dir_path: Path | None = None, exts: Iterable[str] = AUDIO_EXTS):
+        self.dir_path = dir_path or new_download_dir()
+        self.exts = tuple(exts)
+        self._tab = None
+        self._names: dict[str, str] = {}  # guid → suggested filename
+        self._done: asyncio.Future | None = None
+        self._inotify: InotifyWatcher | None = None
+
+    async def attach(self, tab) -> "DownloadWatcher":
+        self._tab = tab
+        self._done = asyncio.get_running_loop().create_future()
+        tab.add_handler(cdp.browser.DownloadWillBegin, self._on_begin)
+        tab.add_handler(cdp.browser.DownloadProgress, self._on_progress)
+        await tab.send(
+            cdp.browser.set_download_behavior(
+                behavior="allow",
+                download_path=str(self.dir_path),
+                events_enabled=True,
+            )
+        )
+        if InotifyWatcher.available():
+            try:
+                self._inotify = InotifyWatcher(self.dir_path, self.exts).start()
+            except OSError as e:
+                logger.debug("inotify unavailable, relying on CDP events: %s", e)
+        logger.info("📂  Downloads for this run go to %s", self.dir_path)
+        return self
+
+    def _on_begin(self, event: "cdp.browser.DownloadWillBegin") -> None:
+        frame_id = getattr(self._tab.target, "target_id", None)
+        if frame_id is not None and event.frame_id != frame_id:
+            return  # a download started by another tab of the same browser
+        self._names[event.guid] = event.suggested_filename
+        logger.info("⏬  Download started: %s", event.suggested_filename)
+
+    def _on_progress(self, event: "cdp.browser.DownloadProgress") -> None:
+        name = self._names.get(event.guid)
+        if name is None or self._done.done():
+            return
+        state = getattr(event.state, "value", event.state)
+        if state == "completed":
+            self._done.set_result(self.dir_path / name)
+        elif state == "canceled":
+            self._done.set_exception(RuntimeError(f"Download of {name} was canceled"))
+
+    async def wait(self, timeout_s: float = 120) -> Path:
+        """Return the downloaded file as soon as either signal fires."""
+        start = time.perf_counter()
+        waiters = [self._done]
+        if self._inotify is not None:
+            waiters.append(self._inotify.done)
+
+        done, _ = await asyncio.wait(
+            waiters, timeout=timeout_s, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
+            raise TimeoutError(
+                f"Download did not finish in {timeout_s}s (dir: {self.dir_path})"
+            )
+        path = done.pop().result()
+        logger.info(
+            "✅  Download complete after %.3f s → %s", time.perf_counter() - start, path
+        )
+        LAST_DOWNLOAD.write_text(str(path), encoding="utf-8")
+        return path
+
+    async def detach(self) -> None:
+        if self._inotify is not None:
+            self._inotify.stop()
+        if self._tab is not None:
+            self._tab.remove_handlers(cdp.browser.DownloadWillBegin, self._on_begin)
+            self._tab.remove_handlers(cdp.browser.DownloadProgress, self._on_progress)
@@ -2,29 +2,21 @@
 import asyncio
 import logging
 import signal
-import time
-import urllib.parse
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Optional
 
 import zendriver as nodriver  # a.k.a. nodriver
 
-from utils import get_cookies_store, start_browser
+from utils import get_cookies_store, start_browser, wait_for_host
 
 logger = logging.getLogger(__name__)
 
 
 async def wait_until_host(tab: nodriver.Tab, target: str, timeout: int = 300):
     """Pause until `tab.url` lands on `target` (host only)."""
-    start = time.time()
-    while (time.time() - start) < timeout:
-        host = urllib.parse.urlparse(tab.url).netloc
-        if host == target:
-            await asyncio.sleep(1)  # let UI settle
-            return
-        await asyncio.sleep(0.5)
-    raise TimeoutError(f"Still not on {target} after {timeout}s (now on {host})")
+    await wait_for_host(tab, target, timeout)
+    await asyncio.sleep(1)  # let UI settle
 
 
 class CookieAutoSaver:
@@ -0,0 +1,250 @@
+import asyncio
+import datetime as dt
+import json
+import logging
+import random
+from dataclasses import dataclass
+from pathlib import Path
+
+from artifacts import RunStore
+from chatgpt_pull import conversation_id
+from pipeline import run_once
+from utils import BrowserPool
+
+UTC = dt.timezone.utc
+JOBS_FILE = Path.cwd() / "jobs.json"
+KEEP_WARM_INTERVAL_S = 3600  # health-check pooled browsers while idle
+RESUME_TRIES = 2  # resume a failed run this many times
+RESUME_BACKOFF_S = 60
+
+logger = logging.getLogger(__name__)
+
+
+# ───────── cron expressions ─────────
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))  # min hour dom month dow
+
+
+def _parse_field(text: str, low: int, high: int) -> tuple[int, ...]:
+    values: set[int] = set()
+    for part in text.split(","):
+        rng, _, step = part.partition("/")
+        if rng == "*":
+            start, end = low, high
+        elif "-" in rng:
+            start, end = map(int, rng.split("-", 1))
+        else:
+            start = int(rng)
+            end = high if step else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"{part!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, int(step or 1)))
+    return tuple(sorted(values))
+
+
+@dataclass(frozen=True)
+class Cron:
+    """A five-field cron expression (minute hour day month weekday), in UTC."""
+
+    expr: str
+    minutes: tuple[int, ...]
+    hours: tuple[int, ...]
+    days: tuple[int, ...]
+    months: tuple[int, ...]
+    weekdays: tuple[int, ...]  # 0 = Sunday
+    any_day: bool
+    any_weekday: bool
+
+    @classmethod
+    def parse(cls, expr: str) -> "Cron":
+        fields = _ALIASES.get(expr.strip(), expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected 5 cron fields, got {expr!r}")
+        minutes, hours, days, months, weekdays = (
+            _parse_field(f, low, high) for f, (low, high) in zip(fields, _FIELDS)
+        )
+        weekdays = tuple(sorted({d % 7 for d in weekdays}))  # 7 is Sunday too
+        return cls(
+            expr,
+            minutes,
+            hours,
+            days,
+            months,
+            weekdays,
+            fields[2] == "*",
+            fields[4] == "*",
+        )
+
+    def _day_matches(self, day: dt.datetime) -> bool:
+        dom = day.day in self.days
+        dow = day.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return dom and dow
+        return dom or dow  # cron ORs the two when both are restricted
+
+    def next_after(self, when: dt.datetime) -> dt.datetime:
+        """Return the first matching minute strictly after `when`."""
+        earliest = when.astimezone(UTC).replace(second=0, microsecond=0)
+        earliest += dt.timedelta(minutes=1)
+        day = earliest.replace(hour=0, minute=0)
+        for _ in range(5 * 366):
+            if day.month in self.months and self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= earliest:
+                            return candidate
+            day += dt.timedelta(days=1)
+        raise ValueError(f"Cron expression {self.expr!r} never fires")
+
+    def last_until(self, since: dt.datetime, until: dt.datetime) -> dt.datetime | None:
+        """Return the latest occurrence in `(since, until]`, if any."""
+        last = None
+        occurrence = self.next_after(since)
+        while occurrence <= until:
+            last, occurrence = occurrence, self.next_after(occurrence)
+        return last
+
+
+# ───────── jobs ─────────
+@dataclass
+class Job:
+    name: str
+    cron: Cron
+    conversation: str | None = None  # default: conversation_id from the .env
+    show: str | None = None  # Spotify show ID; default: the dashboard's show
+    jitter_s: float | None = None  # default: the scheduler's jitter
+
+
+def load_jobs(path: Path = JOBS_FILE) -> list[Job]:
+    """
+    Read the job list, e.g.
+    `[{"name": "markets", "conversation": "…", "cron": "0 5 * * 1-5",
+    "show": "4rOoJ6Egrf8K2IrywzwOMk"}]`. Without a jobs file, a single
+    "daily" job runs the .env conversation at 05:00 UTC.
+    """
+    try:
+        entries = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return [Job("daily", Cron.parse("0 5 * * *"), conversation_id())]
+    jobs = [
+        Job(
+            name=e["name"],
+            cron=Cron.parse(e["cron"]),
+            conversation=e.get("conversation"),
+            show=e.get("show"),
+            jitter_s=e.get("jitter_s"),
+        )
+        for e in entries
+    ]
+    if len({j.name for j in jobs}) != len(jobs):
+        raise ValueError(f"Job names in {path} must be unique")
+    return jobs
+
+
+# ───────── execution ─────────
+async def run_with_resume(
+    pool: BrowserPool | None,
+    run_id: str,
+    conversation: str | None = None,
+    show: str | None = None,
+) -> bool:
+    """Run `run_id`, resuming it after failures; returns True once it succeeds."""
+    for attempt in range(1, RESUME_TRIES + 2):
+        try:
+            # ← await, no nested loop; retries resume the same run
+            await run_once(pool, run_id, conversation, show)
+            logger.info("Run %s finished", run_id)
+            return True
+        except Exception:
+            logger.exception("Run %s failed (attempt %d)", run_id, attempt)
+            if attempt <= RESUME_TRIES:
+                await asyncio.sleep(RESUME_BACKOFF_S * attempt)
+        finally:
+            if pool is not None:
+                await pool.end_run()
+    return False
+
+
+class Scheduler:
+    """
+    Run several cron jobs against one browser pool.
+
+    The last occurrence of every job is persisted in the run store. On start,
+    an interrupted run is resumed and the latest occurrence missed while the
+    host was down is caught up once. Each start is delayed by a random jitter
+    and at most `max_concurrent` pipelines run at a time.
+    """
+
+    def __init__(
+        self,
+        jobs: list[Job],
+        pool: BrowserPool | None = None,
+        max_concurrent: int = 1,
+        jitter_s: float = 0,
+        store: RunStore | None = None,
+        slots: asyncio.Semaphore | None = None,
+    ):
+        self.jobs = jobs
+        self.pool = pool
+        self.jitter_s = jitter_s
+        self.store = store or RunStore()
+        # pass `slots` to share the concurrency cap with other run sources
+        self._slots = slots or asyncio.Semaphore(max_concurrent)
+
+    async def _execute(self, job: Job, due: dt.datetime, run_id: str | None) -> None:
+        jitter = job.jitter_s if job.jitter_s is not None else self.jitter_s
+        if jitter > 0:
+            await asyncio.sleep(random.uniform(0, jitter))
+        async with self._slots:
+            run_id = run_id or self.store.new_run()
+            self.store.set_job_state(job.name, due.timestamp(), run_id, "running")
+            logger.info("▶️  Job %s (%s) → run %s", job.name, job.cron.expr, run_id)
+            ok = await run_with_resume(self.pool, run_id, job.conversation, job.show)
+            status = "done" if ok else "failed"
+            self.store.set_job_state(job.name, due.timestamp(), run_id, status)
+
+    async def _catch_up(self, job: Job, now: dt.datetime) -> None:
+        state = self.store.job_state(job.name)
+        if state is None:
+            return  # first start: nothing was missed yet
+        last_due, run_id, status = state
+        last_due = dt.datetime.fromtimestamp(last_due, UTC)
+        if status == "running":
+            logger.info("🔁  Job %s was interrupted; resuming run %s", job.name, run_id)
+            await self._execute(job, last_due, run_id)
+        elif (missed := job.cron.last_until(last_due, now)) is not None:
+            logger.info("⏪  Job %s missed its %s run; catching up", job.name, missed)
+            await self._execute(job, missed, None)
+
+    async def _job_loop(self, job: Job) -> None:
+        now = dt.datetime.now(UTC)
+        await self._catch_up(job, now)
+        while True:
+            due = job.cron.next_after(max(now, dt.datetime.now(UTC)))
+            sleep_for = (due - dt.datetime.now(UTC)).total_seconds()
+            logger.info("Job %s sleeping %.1f s until %s", job.name, sleep_for, due)
+            await asyncio.sleep(max(sleep_for, 0))
+            await self._execute(job, due, None)
+            now = due
+
+    async def _keep_warm(self) -> None:
+        while True:
+            await asyncio.sleep(KEEP_WARM_INTERVAL_S)
+            await self.pool.keep_warm()
+
+    async def run(self) -> None:
+        loops = [asyncio.create_task(self._job_loop(job)) for job in self.jobs]
+        if self.pool is not None:
+            loops.append(asyncio.create_task(self._keep_warm()))
+        try:
+            await asyncio.gather(*loops)
+        finally:
+            for task in loops:
+                task.cancel()
+            await asyncio.gather(*loops, return_exceptions=True)
@@ -0,0 +1,257 @@
+"""
+Where the pipeline's buttons and fields live on each site.
+
+Every element is registered once per site, as CSS/ARIA selectors tried in
+order plus an optional visible-text fallback. On every poll `locate()` asks
+the page, in one script, which selector matches first and fetches only that
+element; the slow full-text search comes last. It records which strategy hit
+and how long the lookup took as a `locate.<site>.<name>` metric span.
+
+Check the registry against a saved page (or a live URL) after a site redesign:
+
+    python src/locators.py snapshots/notebooklm.html --site notebooklm
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from metrics import span
+from utils import start_browser
+
+TIMEOUT_S = 10  # same default as tab.find
+POLL_S = 0.25
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Locator:
+    css: tuple[str, ...] = ()  # tried in order
+    text: str | None = None  # fallback: the element showing this text
+
+    @property
+    def selector(self) -> str:
+        """All CSS alternatives as one selector list, for `tab.wait_for`."""
+        return ", ".join(self.css)
+
+
+LOCATORS: dict[str, dict[str, Locator]] = {
+    "notebooklm": {
+        "create_notebook": Locator(
+            ("button.create-new-button", "button[aria-label='Create new notebook' i]"),
+            "Create new notebook",
+        ),
+        "my_notebooks": Locator(
+            ("button[aria-label='My notebooks' i]",), "My notebooks"
+        ),
+        "notebook_card": Locator(("project-button mat-card[role='button']",)),
+        "add_source": Locator(
+            ("button.add-source-button", "button[aria-label='Add source' i]"),
+            "Add source",
+        ),
+        "copied_text": Locator(
+            ("button.copied-text-chip", "[role='dialog'] [aria-label='Copied text' i]"),
+            "Copied text",
+        ),
+        "source_text": Locator(("textarea[formcontrolname='text']",)),
+        "source_more": Locator(("button.source-item-more-button",)),
+        "audio_overview": Locator(("button.audio-overview-button",)),
+        "audio_more": Locator(("button.artifact-more-button",)),
+        "download": Locator(
+            (
+                "[role='menuitem'].download-button",
+                "[role='menuitem'][aria-label*='download' i]",
+                "[role='menu'] a[download]",
+            ),
+            "download",
+        ),
+        "notebook_title": Locator(("h1.notebook-title",)),
+    },
+    "spotify": {
+        "continue_with_spotify": Locator(
+            ("button[aria-label*='Continue with Spotify' i]",),
+            "Continue with Spotify",
+        ),
+        "file_input": Locator(("input[type='file']",)),
+        "title": Locator(("input[name='title']",)),
+        "html_toggle": Locator(
+            ("button[aria-label='HTML' i]", "[role='switch'][aria-label*='HTML' i]"),
+            "HTML",
+        ),
+        "description": Locator(("textarea[name='description']",)),
+        "next": Locator(
+            ("button[aria-label='Next' i]", "button[data-testid='next-button']"),
+            "Next",
+        ),
+        "publish_now": Locator(("label[for='publish-date-now']",)),
+        "publish_schedule": Locator(("label[for='publish-date-schedule']",)),
+        "schedule_value": Locator(("input[name='publish-date-value']",)),
+        "publish": Locator(("button[type='submit'][form='review-form']",)),
+    },
+}
+
+# Index of the first selector in the list that matches an element, or -1
+FIRST_MATCH_JS = """
+%s.findIndex((s) => {
+    try { return document.querySelector(s) !== null; } catch (e) { return false; }
+})
+"""
+
+_fell_back: set[tuple[str, str]] = set()
+
+
+def locator(site: str, name: str) -> Locator:
+    return LOCATORS[site][name]
+
+
+def selector(site: str, name: str) -> str:
+    return locator(site, name).selector
+
+
+async def locate(tab, site: str, name: str, timeout: float = TIMEOUT_S):
+    """
+    Return the element registered as `site`/`name`. Each poll checks all CSS
+    selectors in one script and runs the text search only if none matched.
+    Raises asyncio.TimeoutError like `tab.find`.
+    """
+    loc = locator(site, name)
+    first_match = FIRST_MATCH_JS % json.dumps(list(loc.css))
+    deadline = time.monotonic() + timeout
+    with span(f"locate.{site}.{name}") as attrs:
+        while True:
+            i = await tab.evaluate(first_match) if loc.css else -1
+            if isinstance(i, int) and i >= 0:
+                if (el := await tab.query_selector(loc.css[i])) is not None:
+                    attrs.update(strategy="css", selector=i)
+                    return el
+            if loc.text and (
+                el := await tab.find_element_by_text(loc.text, best_match=True)
+            ):
+                attrs["strategy"] = "text"
+                if loc.css and (site, name) not in _fell_back:
+                    _fell_back.add((site, name))
+                    logger.warning(
+                        "No CSS selector matched %s/%s; found it by text. "
+                        "Update its selectors in locators.py",
+                        site,
+                        name,
+                    )
+                return el
+            if time.monotonic() > deadline:
+                attrs["strategy"] = "none"
+                raise asyncio.TimeoutError(f"{site}/{name} not found in {timeout} s")
+            await asyncio.sleep(POLL_S)
+
+
+# ───────── diagnostics ─────────
+# For every [selectors, text] pair: which selectors match, whether the text
+# appears in an element of the page, and how long each lookup took (ms). Like
+# a text search in `locate()`, a text lookup includes walking the page
+CHECK_JS = """
+((checks) => {
+    const timed = (lookup) => {
+        const start = performance.now();
+        const hit = lookup();
+        return [hit, performance.now() - start];
+    };
+    const [texts, walk_ms] = timed(() => {
+        const texts = [];
+        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+        while (walker.nextNode()) {
+            texts.push(walker.currentNode.textContent.toLowerCase());
+        }
+        return texts;
+    });
+    return checks.map(([css, text]) => {
+        const css_hits = css.map((s) => timed(() => {
+            try { return !!document.querySelector(s); } catch (e) { return null; }
+        }));
+        const [text_hit, text_ms] = text
+            ? timed(() => texts.some((t) => t.includes(text.toLowerCase())))
+            : [null, 0];
+        return {
+            css: css_hits.map(([hit]) => hit),
+            css_ms: css_hits.map(([, ms]) => ms),
+            text: text_hit,
+            text_ms: text ? walk_ms + text_ms : null,
+        };
+    });
+})(%s)
+"""
+
+
+async def check_page(tab, site: str) -> dict[str, dict]:
+    """Evaluate every locator of `site` against the page open in `tab`."""
+    names = list(LOCATORS[site])
+    checks = [[list(locator(site, n).css), locator(site, n).text] for n in names]
+    results = await tab.evaluate(CHECK_JS % json.dumps(checks))
+    return dict(zip(names, results))
+
+
+def verdict(result: dict) -> str:
+    if None in result["css"]:
+        return "invalid selector"
+    if any(result["css"]):
+        return f"css #{result['css'].index(True)}"
+    if result["text"]:
+        return "text only"
+    return "not on page"
+
+
+def timings(result: dict) -> str:
+    """Lookup times in the order `locate()` tries them: selectors, then text."""
+    parts = [f"css #{i} {ms:.2f} ms" for i, ms in enumerate(result["css_ms"])]
+    if result["text_ms"] is not None:
+        parts.append(f"text {result['text_ms']:.2f} ms")
+    return ", ".join(parts)
+
+
+async def check(snapshot: str, sites: list[str]) -> bool:
+    """
+    Open a saved page (or URL) in a throwaway headless browser and report
+    every locator with the time of each lookup. Returns False if a selector
+    is invalid or only the text fallback matched.
+    """
+    url = snapshot if "://" in snapshot else Path(snapshot).resolve().as_uri()
+    browser = await start_browser("locators", headless=True)
+    ok = True
+    try:
+        tab = await browser.get(url)
+        await tab.wait(1)  # let scripts render the page
+        for site in sites:
+            print(f"{site}:")
+            for name, result in (await check_page(tab, site)).items():
+                status = verdict(result)
+                ok = ok and status not in ("invalid selector", "text only")
+                print(f"  {name:<24} {status:<18} {timings(result)}")
+    finally:
+        await browser.stop()
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Check the selector registry against a saved page"
+    )
+    parser.add_argument("snapshot", help="Saved HTML file or URL")
+    parser.add_argument(
+        "--site",
+        choices=sorted(LOCATORS),
+        action="append",
+        help="Site(s) to check (default: all)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s"
+    )
+    return 0 if asyncio.run(check(args.snapshot, args.site or sorted(LOCATORS))) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
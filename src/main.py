@@ -2,45 +2,206 @@ import argparse
 import asyncio
 import datetime as dt
 import logging
+import os
 import sys
+import time
 import zoneinfo
+from pathlib import Path
 
-from chatgpt_pull import get_latest_reply
-from notebooklm_gen import generate_podcast
-from spotify_upload import upload_podcast
+from artifacts import RunStore
+from chatgpt_pull import (
+    AssistantMessage,
+    assistant_messages,
+    chatgpt_base_url,
+    conversation_id,
+    fetch_assistant_messages,
+    fetch_conversation,
+    open_api_origin,
+)
+from jobs import JOBS_FILE, Scheduler, load_jobs, run_with_resume
+from pipeline import new_run_for_message, run_batch, run_once
+from utils import (
+    BrowserPool,
+    LoginRequiredError,
+    browser_session,
+    first_run_login,
+    get_cookies_store,
+)
 
 UTC = zoneinfo.ZoneInfo("UTC")
 LOGF = "daily.log"
+WATCH_INTERVAL_S = 60  # conversation poll interval in --watch mode
 
 
 # ───────────────────────── helpers ──────────────────────────
-def seconds_until_5utc() -> float:
+def seconds_until_utc(hour: int, minute: int = 0) -> float:
     now = dt.datetime.now(UTC)
-    target = now.replace(hour=5, minute=0, second=0, microsecond=0)
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
     if target <= now:
         target += dt.timedelta(days=1)
     return (target - now).total_seconds()
 
 
-# ───────── make the pipeline async ─────────
-async def run_once() -> None:
-    md, title, description = await get_latest_reply()
-    title2, description2, wav = await generate_podcast(md)
-    # Use the NotebookLM title + description as fallback
-    await upload_podcast(title or title2, description or description2, wav)
+def parse_hhmm(value: str) -> tuple[int, int]:
+    hour, _, minute = value.partition(":")
+    h, m = int(hour), int(minute or 0)
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise argparse.ArgumentTypeError(f"not a HH:MM time: {value}")
+    return h, m
 
 
-# ───────── daily scheduler ─────────
-async def scheduler() -> None:
-    while True:
-        sleep_for = seconds_until_5utc()
-        logging.info("Sleeping %.1f s until next 05:00 UTC run", sleep_for)
-        await asyncio.sleep(sleep_for)
-        try:
-            await run_once()  # ← await, no nested loop
-            logging.info("Daily run finished")
-        except Exception:
-            logging.exception("Daily run failed")
+# ───────── scheduler ─────────
+async def scheduler(
+    keep_warm: bool = True,
+    jobs_file: Path = JOBS_FILE,
+    max_concurrent: int = 1,
+    jitter_s: float = 0,
+) -> None:
+    pool = BrowserPool() if keep_warm else None
+    jobs = load_jobs(jobs_file)
+    logging.info(
+        "Scheduling %s (at most %d at a time)",
+        ", ".join(f"{j.name} [{j.cron.expr}]" for j in jobs),
+        max_concurrent,
+    )
+    try:
+        await Scheduler(jobs, pool, max_concurrent, jitter_s).run()
+    finally:
+        if pool is not None:
+            await pool.close()
+
+
+# ───────── watch mode ─────────
+def start_watched_run(
+    store: RunStore, cid: str, message: AssistantMessage
+) -> str | None:
+    """
+    Start a run for `message` and remember it as handled in the run store.
+    Returns None, without a run, if the reply has no usable JSON block.
+    """
+    try:
+        run_id = new_run_for_message(store, message.id, message.markdown)
+    except ValueError as e:
+        logging.warning("Skipping reply %s without a JSON block: %s", message.id, e)
+        run_id = None
+    store.set_watch_message(cid, message.id)
+    return run_id
+
+
+async def poll_reply(
+    pool: BrowserPool, store: RunStore, cid: str, interval_s: float
+) -> str:
+    """
+    Keep the conversation's API origin open and poll it; return a run ID as
+    soon as a finished assistant reply appears that no run has handled yet.
+    """
+    async with browser_session("chatgpt", pool) as (browser, tab):
+        await first_run_login(
+            browser,
+            tab,
+            get_cookies_store("chatgpt"),
+            f"{chatgpt_base_url()}/auth/login",
+        )
+        await open_api_origin(tab)
+        while True:
+            messages = assistant_messages(await fetch_conversation(tab, cid))
+            message = messages[-1] if messages else None  # none in a new chat
+            if (
+                message is not None
+                and message.finished
+                and message.id != store.watch_state(cid)[0]
+                and store.run_for_message(message.id) is None
+            ):
+                logging.info("🆕  New reply %s in conversation %s", message.id, cid)
+                if (run_id := start_watched_run(store, cid, message)) is not None:
+                    return run_id
+            await asyncio.sleep(interval_s)
+
+
+async def latest_reply_run(pool: BrowserPool, store: RunStore, cid: str) -> str | None:
+    """
+    Return the run for the conversation's latest finished reply: the run that
+    already handled it (to resume), or a new one.
+    """
+    messages = await fetch_assistant_messages(pool, cid)
+    if not messages:
+        logging.warning("Conversation %s has no finished reply yet", cid)
+        return None
+    message = messages[-1]
+    if (handled := store.run_for_message(message.id)) is not None:
+        return handled[0]
+    return start_watched_run(store, cid, message)
+
+
+async def next_run(
+    pool: BrowserPool,
+    store: RunStore,
+    cid: str,
+    interval_s: float,
+    deadline: tuple[int, int],
+) -> str | None:
+    """
+    Wait for a new reply until the daily `deadline` (UTC). Past it, fall back
+    to the latest reply unless a run succeeded in the last 24 hours.
+    """
+    try:
+        return await asyncio.wait_for(
+            poll_reply(pool, store, cid, interval_s), seconds_until_utc(*deadline)
+        )
+    except asyncio.TimeoutError:
+        pass
+    success_at = store.watch_state(cid)[1]
+    if success_at is not None and time.time() - success_at < 86_400:
+        return None  # already published since the previous deadline
+    logging.info("⏰  No new reply by %02d:%02d UTC; running anyway", *deadline)
+    return await latest_reply_run(pool, store, cid)
+
+
+async def watch(
+    interval_s: float = WATCH_INTERVAL_S, deadline: tuple[int, int] = (5, 0)
+) -> None:
+    """
+    Start the pipeline as soon as a new reply lands in the conversation; if
+    none has by the daily `deadline` (UTC), fall back to a regular run. The
+    last handled reply and the last success are kept in the run store, so a
+    restart neither repeats nor forgets them.
+    """
+    pool = BrowserPool()
+    store = RunStore()
+    cid = conversation_id()
+    try:
+        while True:
+            try:
+                run_id = await next_run(pool, store, cid, interval_s, deadline)
+            except LoginRequiredError:
+                raise
+            except Exception:
+                logging.exception("Watching the conversation failed; retrying")
+                await pool.keep_warm()  # drop a ChatGPT browser that died
+                await asyncio.sleep(interval_s)
+                continue
+            if run_id is not None and await run_with_resume(pool, run_id):
+                store.set_watch_success(cid, time.time())
+    finally:
+        await pool.close()
+
+
+async def run_now(run_id: str | None = None) -> None:
+    pool = BrowserPool()
+    try:
+        await run_once(pool, run_id)
+    finally:
+        await pool.close()
+
+
+async def run_jobs_now(jobs_file: Path, notebooklm_workers: int) -> bool:
+    """Produce one episode per job in `jobs_file`, all in one batch."""
+    episodes = {
+        j.name: (j.conversation or conversation_id(), j.show)
+        for j in load_jobs(jobs_file)
+    }
+    result = await run_batch(episodes, notebooklm_workers=notebooklm_workers)
+    return not result.failed
 
 
 # ───────────────────────── main ────────────────────────────
@@ -54,6 +215,72 @@ def main() -> None:
         action="store_true",
         help="Run immediately once and exit (skip the daily schedule)",
     )
+    parser.add_argument(
+        "--cold",
+        action="store_true",
+        help="Start and stop a fresh browser for every stage instead of keeping them warm",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run every browser headless (same as HEADLESS=1 in the .env)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=Path,
+        default=JOBS_FILE,
+        help="Scheduled jobs (name, conversation, cron, show); default: %(default)s",
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Cap on pipelines running at the same time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="Delay every scheduled start by up to this many random seconds",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Run every job in --jobs once, now, as one concurrent batch",
+    )
+    parser.add_argument(
+        "--notebooklm-workers",
+        type=int,
+        default=2,
+        metavar="N",
+        help="Notebooks a --batch generates at the same time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Run as soon as a new ChatGPT reply lands instead of at 05:00 UTC",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=WATCH_INTERVAL_S,
+        metavar="SECONDS",
+        help="How often --watch polls the conversation (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=parse_hhmm,
+        default=(5, 0),
+        metavar="HH:MM",
+        help="In --watch mode, run anyway if no new reply arrived by this UTC time",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Resume a failed run (or 'latest') at its first incomplete stage",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -65,10 +292,27 @@ def main() -> None:
         ],
     )
 
-    if args.now:  # one-off run
-        asyncio.run(run_once())
+    if args.headless:
+        os.environ["HEADLESS"] = "1"
+
+    if args.batch:  # one episode per job, right now
+        ok = asyncio.run(run_jobs_now(args.jobs, args.notebooklm_workers))
+        sys.exit(0 if ok else 1)
+    elif args.now or args.resume:  # one-off run
+        asyncio.run(
+            run_once(run_id=args.resume) if args.cold else run_now(args.resume)
+        )
+    elif args.watch:  # event-driven loop with a daily fallback
+        asyncio.run(watch(args.watch_interval, args.deadline))
     else:  # scheduled loop
-        asyncio.run(scheduler())
+        asyncio.run(
+            scheduler(
+                keep_warm=not args.cold,
+                jobs_file=args.jobs,
+                max_concurrent=args.max_concurrent,
+                jitter_s=args.jitter,
+            )
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+import argparse
+import contextvars
+import json
+import logging
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+METRICS_DIR = Path.cwd() / "metrics"
+PROM_FILE = "podcast_pipeline.prom"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    start: float  # seconds since the run started
+    duration: float
+    status: str = "ok"
+    attrs: dict = field(default_factory=dict)
+
+
+@dataclass
+class RunMetrics:
+    """Timing spans collected for a single pipeline run."""
+
+    run_id: str
+    started_at: float = field(default_factory=time.time)
+    t0: float = field(default_factory=time.perf_counter)
+    spans: list[Span] = field(default_factory=list)
+    status: str = "running"
+    token: contextvars.Token | None = field(default=None, repr=False)
+
+    def export(self, status: str, out_dir: Path = METRICS_DIR) -> Path:
+        """Write `<run_id>.json` and refresh the Prometheus textfile."""
+        self.status = status
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"{self.run_id}.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "run_id": self.run_id,
+                    "started_at": self.started_at,
+                    "duration": time.perf_counter() - self.t0,
+                    "status": status,
+                    "spans": [asdict(s) for s in self.spans],
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+        prom_dir = Path(os.getenv("PROMETHEUS_TEXTFILE_DIR", out_dir))
+        write_textfile(self, prom_dir / PROM_FILE)
+        logger.info("📊  Metrics written to %s", path)
+        return path
+
+
+_current: contextvars.ContextVar[RunMetrics | None] = contextvars.ContextVar(
+    "run_metrics", default=None
+)
+
+
+def start_run(run_id: str) -> RunMetrics:
+    """Collect spans for `run_id` in this context (and tasks created from it)."""
+    metrics = RunMetrics(run_id)
+    metrics.token = _current.set(metrics)
+    return metrics
+
+
+def end_run(metrics: RunMetrics) -> None:
+    """Stop collecting into `metrics`; later spans go to the enclosing run."""
+    if metrics.token is not None:
+        _current.reset(metrics.token)
+        metrics.token = None
+
+
+def record(name: str, duration: float, status: str = "ok", **attrs) -> None:
+    """Record an already-measured step (no-op outside a run)."""
+    metrics = _current.get()
+    if metrics is None:
+        return
+    start = time.perf_counter() - metrics.t0 - duration
+    metrics.spans.append(Span(name, start, duration, status, attrs))
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time the enclosed block as step `name`. Yields the attrs dict so callers
+    can add details (retry counts, strategies, sizes) while the step runs.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record(name, time.perf_counter() - start, status, **attrs)
+
+
+# ───────── Prometheus textfile ─────────
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def write_textfile(metrics: RunMetrics, path: Path) -> None:
+    """Atomically write the last run's metrics in the textfile-collector format."""
+    lines = [
+        "# HELP podcast_step_duration_seconds Duration of each step in the last run.",
+        "# TYPE podcast_step_duration_seconds gauge",
+    ]
+    totals: dict[str, float] = {}
+    retries: dict[str, int] = {}
+    for s in metrics.spans:
+        totals[s.name] = totals.get(s.name, 0.0) + s.duration
+        retries[s.name] = retries.get(s.name, 0) + int(s.attrs.get("retries", 0))
+    for name, total in sorted(totals.items()):
+        step = _label(name)
+        lines.append(f'podcast_step_duration_seconds{{step="{step}"}} {total:.3f}')
+    lines += [
+        "# HELP podcast_step_retries Retries per step in the last run.",
+        "# TYPE podcast_step_retries gauge",
+    ]
+    for name, count in sorted(retries.items()):
+        lines.append(f'podcast_step_retries{{step="{_label(name)}"}} {count}')
+    lines += [
+        "# HELP podcast_run_duration_seconds Wall clock of the last run.",
+        "# TYPE podcast_run_duration_seconds gauge",
+        f"podcast_run_duration_seconds {time.perf_counter() - metrics.t0:.3f}",
+        "# HELP podcast_run_success 1 if the last run succeeded.",
+        "# TYPE podcast_run_success gauge",
+        f"podcast_run_success {int(metrics.status == 'ok')}",
+        "# HELP podcast_run_timestamp_seconds Start time of the last run.",
+        "# TYPE podcast_run_timestamp_seconds gauge",
+        f"podcast_run_timestamp_seconds {metrics.started_at:.0f}",
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp.replace(path)
+
+
+# ───────── history summary ─────────
+def percentile(values: list[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def summarize(metrics_dir: Path = METRICS_DIR, last: int | None = None) -> str:
+    """Return a p50/p95 table per step across the stored run history."""
+    files = sorted(metrics_dir.glob("*.json"))
+    if last:
+        files = files[-last:]
+    durations: dict[str, list[float]] = {}
+    retries: dict[str, int] = {}
+    for f in files:
+        for s in json.loads(f.read_text(encoding="utf-8"))["spans"]:
+            durations.setdefault(s["name"], []).append(s["duration"])
+            retries[s["name"]] = retries.get(s["name"], 0) + s["attrs"].get(
+                "retries", 0
+            )
+
+    rows = [f"{'step':<36} {'n':>5} {'p50 s':>9} {'p95 s':>9} {'retries':>8}"]
+    for name in sorted(durations, key=lambda n: -percentile(durations[n], 95)):
+        values = durations[name]
+        rows.append(
+            f"{name:<36} {len(values):>5} {percentile(values, 50):>9.2f} "
+            f"{percentile(values, 95):>9.2f} {retries[name]:>8}"
+        )
+    rows.append(f"({len(files)} runs from {metrics_dir})")
+    return "\n".join(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarise pipeline step timings")
+    parser.add_argument("--dir", type=Path, default=METRICS_DIR)
+    parser.add_argument("--last", type=int, help="Only use the last N runs")
+    args = parser.parse_args()
+    print(summarize(args.dir, args.last))
+
+
+if __name__ == "__main__":
+    main()
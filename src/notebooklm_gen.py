@@ -1,118 +1,282 @@
 import asyncio
 import logging
-import tempfile
+import os
+import re
 import time
+import urllib.parse
+import weakref
+from collections.abc import Callable
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Iterable
+
+from dotenv import load_dotenv
 
 # from nodriver import loop
 from zendriver import loop
 
-from utils import first_run_login, get_cookies_store, start_browser
+from artifacts import RunStore
+from downloads import DownloadWatcher
+from locators import locate, selector
+from metrics import record, span
+from steps import STEP_RETRIES, reload_tab, run_step
+from utils import (
+    BrowserPool,
+    LoginRequiredError,
+    browser_session,
+    first_run_login,
+    get_cookies_store,
+    inject_text,
+    site_url,
+    wait_for_condition,
+)
 
-DOWNLOAD_DIR = Path.home() / "Downloads"
 TIMEOUT_S = 120  # 2-minute max
+JOB_TIMEOUT_S = 900  # notebook creation + generation + download, per job
+SOURCE_CHARS = 50_000  # larger replies are split into several sources
+INGEST_TIMEOUT_S = 300
+NAV_TIMEOUT_S = 60
+NOTEBOOK_TIMEOUT_S = INGEST_TIMEOUT_S + 120  # create, paste sources, start audio
+GENERATION_TIMEOUT_S = 600  # per attempt; generation goes on across reloads
+FETCH_TIMEOUT_S = TIMEOUT_S + 60  # open the menu, download, read metadata
 
 logger = logging.getLogger(__name__)
 
+# Browser.setDownloadBehavior is browser-wide, so tabs of one browser take
+# turns for the (short) download step while generation runs in parallel.
+_download_locks: "weakref.WeakKeyDictionary[object, asyncio.Lock]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _download_lock(tab) -> asyncio.Lock:
+    return _download_locks.setdefault(tab.browser, asyncio.Lock())
+
+
+AUDIO_BTN = selector("notebooklm", "audio_overview")
+AUDIO_MORE_BTN = selector("notebooklm", "audio_more")
+SOURCE_MORE_BTN = selector("notebooklm", "source_more")
+
+# All `n` sources listed and none of them still processing
+SOURCES_READY_JS = (
+    "document.querySelectorAll('%s').length >= %%d && "
+    "!document.querySelector('.source-panel mat-progress-spinner, "
+    ".source-panel .loading-spinner')" % SOURCE_MORE_BTN
+)
+
+# The tab moved from the home page into a (new) notebook
+NOTEBOOK_OPEN_JS = "location.pathname.includes('/notebook/')"
+
+# Pick the delete/remove entry of an open ⋮ menu, then confirm its dialog
+CLICK_DELETE_ITEM_JS = """
+(() => {
+    const item = [...document.querySelectorAll("[role='menuitem']")]
+        .find(e => /delete|remove/i.test(e.textContent));
+    item?.click();
+    return !!item;
+})()
+"""
+CONFIRM_DIALOG_JS = """
+(() => {
+    const button = [...document.querySelectorAll('mat-dialog-container button')]
+        .find(e => /delete|remove|confirm/i.test(e.textContent));
+    button?.click();
+    return !!button;
+})()
+"""
+
+
+async def new_notebook(
+    tab, md: str, on_created: Callable[[str], None] | None = None
+) -> None:
+    # Locate "Create new notebook" button and click it
+    logger.info("⏳  Creating new notebook…")
+    # ── A. click the “My notebooks” toggle ────────────────────────────
+    create_button = await locate(tab, "notebooklm", "create_notebook")
+    await create_button.click()
+    await wait_for_condition(
+        tab, NOTEBOOK_OPEN_JS, NAV_TIMEOUT_S, label="new notebook opened"
+    )
+    if on_created is not None:  # before anything else can fail
+        on_created(tab.url)
+
+    # ---- after you clicked “Create / New notebook” -------------------
+    await _add_sources(tab, chunk_markdown(md))
+    await _start_audio_overview(tab)
+
+
+def source_chars() -> int:
+    load_dotenv()
+    return int(os.getenv("NOTEBOOKLM_SOURCE_CHARS", SOURCE_CHARS))
+
+
+# Boundaries to split at, best first: headings, paragraphs, lines
+_BOUNDARIES = (r"(?<=\n)(?=#{1,6} )", r"(?<=\n\n)", r"(?<=\n)")
+
+
+def _pieces(text: str, max_chars: int, level: int = 0) -> list[str]:
+    """Split `text` at the best boundary that yields pieces under `max_chars`."""
+    if len(text) <= max_chars:
+        return [text]
+    if level == len(_BOUNDARIES):
+        return [text[i : i + max_chars] for i in range(0, len(text), max_chars)]
+    return [
+        piece
+        for part in re.split(_BOUNDARIES[level], text)
+        for piece in _pieces(part, max_chars, level + 1)
+    ]
+
 
-async def wait_for_download(
-    dir_path: Path,
-    timeout_s: int = 120,
-    exts: Iterable[str] = (".wav", ".m4a", ".mp3"),
-    poll_s: float = 0.5,
-) -> Path:
+def chunk_markdown(md: str, max_chars: int | None = None) -> list[str]:
     """
-    Wait until a NEW file with one of `exts` is fully downloaded in `dir_path`.
-    Detects Chrome's .crdownload and ignores pre-existing files.
-    Returns the final Path.
+    Split `md` into sources of at most `max_chars`, preferring heading and
+    then paragraph boundaries. Short replies come back as a single chunk.
     """
-    dir_path = Path(dir_path)
-    start_ts = time.time()  # EPOCH seconds (matches st_mtime)
-    baseline = {p.name for p in dir_path.iterdir()}  # files that already existed
-
-    deadline = start_ts + timeout_s
-    last_sizes: dict[Path, int] = {}
-
-    while True:
-        # any active Chrome temp downloads?
-        tmp_files = list(dir_path.glob("*.crdownload"))
-
-        # candidates that are *new* (not in baseline) and with desired extension
-        candidates = [
-            p
-            for p in dir_path.iterdir()
-            if p.suffix.lower() in exts
-            and p.name not in baseline
-            and p.stat().st_mtime >= start_ts - 1  # allow 1s clock fuzz
-        ]
-
-        # if we have candidates and no temp files are present → likely finished
-        if candidates and not tmp_files:
-            newest = max(candidates, key=lambda p: p.stat().st_mtime)
-
-            # Optional: double-check the size is stable across two polls
-            size = newest.stat().st_size
-            if last_sizes.get(newest) == size:
-                return newest  # stable → done
-            last_sizes[newest] = size
-            # fall through to sleep then re-check
-
-        # timeout?
-        if time.time() > deadline:
-            tmp_names = ", ".join(t.name for t in tmp_files) or "none"
-            raise TimeoutError(
-                f"Download did not finish in {timeout_s}s (tmp: {tmp_names})"
-            )
+    max_chars = max_chars or source_chars()
+    chunks = [""]
+    for piece in _pieces(md, max_chars):
+        if len(chunks[-1]) + len(piece) > max_chars:
+            chunks.append("")
+        chunks[-1] += piece
+    return [c for c in chunks if c.strip()]
 
-        await asyncio.sleep(poll_s)
 
+async def _add_sources(tab, chunks: list[str]) -> None:
+    """
+    Paste every chunk as its own "Copied text" source (the first source dialog
+    must already be open) without waiting in between, then wait once until
+    all of them are ingested.
+    """
+    started = time.perf_counter()
+    for i, chunk in enumerate(chunks, 1):
+        if i > 1:
+            await (await locate(tab, "notebooklm", "add_source")).click()
+        t = time.perf_counter()
+        with span("notebooklm.source_chunk", chunk=i, chars=len(chunk)):
+            await _paste_source(tab, chunk)
+        logger.info(
+            "📄  Source %d/%d: %d chars in %.2f s",
+            i,
+            len(chunks),
+            len(chunk),
+            time.perf_counter() - t,
+        )
+    if len(chunks) > 1:
+        with span("notebooklm.sources_ingest", sources=len(chunks)):
+            await wait_for_condition(
+                tab,
+                SOURCES_READY_JS % len(chunks),
+                INGEST_TIMEOUT_S,
+                label="sources ingested",
+            )
+        logger.info(
+            "✅  %d sources added and ingested in %.1f s",
+            len(chunks),
+            time.perf_counter() - started,
+        )
 
-async def new_notebook(tab, md: str):
-    # Locate "Create new notebook" button and click it
-    logger.info("⏳  Creating new notebook…")
-    # ── A. click the “My notebooks” toggle ────────────────────────────
-    my_notebooks_button = await tab.find("Create new notebook")
-    await my_notebooks_button.click()
 
-    # ---- after you clicked “Create / New notebook” -------------------
+async def _paste_source(tab, md: str) -> None:
+    """Add `md` as a "Copied text" source via the open source dialog."""
     logger.info("⏳  Waiting for the new notebook dialog to appear…")
-    copied_text = await tab.find("Copied text")
+    copied_text = await locate(tab, "notebooklm", "copied_text")
     await copied_text.click()
     logger.info("✅  Pressed copied text button.")
 
     logger.info("⏳  Waiting for the text input to appear…")
-    textarea = await tab.find("textarea[formcontrolname='text']")
-    await textarea.send_keys(md)  # TODO: make this quicker
-    logger.info("✅  Updated text area.")
+    with span("notebooklm.paste_source", chars=len(md)):
+        textarea = await locate(tab, "notebooklm", "source_text")
+        strategy = await inject_text(tab, textarea, md)
+    logger.info("✅  Updated text area (%d chars via %s).", len(md), strategy)
 
     # Submit the dialog form directly (works for every language / theme)
     await tab.evaluate("document.querySelector('form.content')?.requestSubmit()")
     logger.info("✅  Submitted input text.")
 
-    # TODO: press the customize button on Audio Overview
 
-    # Press the "Audio Overview" button
-    AUDIO_BTN = "button.audio-overview-button"
+async def _start_audio_overview(tab) -> None:
+    # TODO: press the customize button on Audio Overview
 
     # wait until the button exists *and* is enabled
     logger.info("⏳  Waiting for the Audio Overview button to be enabled…")
-    await tab.wait_for(AUDIO_BTN + ":not([disabled])", timeout=20_000)
+    with span("notebooklm.source_ingest"):
+        await tab.wait_for(AUDIO_BTN + ":not([disabled])", timeout=20)
     btn = await tab.select(AUDIO_BTN)  # → NodeHandle
     await btn.click()
     logger.info("✅  Pressed Audio Overview button.")
 
 
+def persistent_notebook() -> str | None:
+    """The notebook (URL or ID) to reuse every day, from NOTEBOOKLM_NOTEBOOK."""
+    load_dotenv()
+    return os.getenv("NOTEBOOKLM_NOTEBOOK") or None
+
+
+def notebook_url(notebook: str) -> str:
+    if "://" in notebook:
+        return notebook
+    return f"{notebooklm_url()}/notebook/{notebook}"
+
+
+def notebook_id(url: str) -> str | None:
+    match = re.search(r"/notebook/([^/?#]+)", url or "")
+    return match.group(1) if match else None
+
+
+async def _maybe_select(tab, selector: str, timeout: float = 2):
+    try:
+        return await tab.select(selector, timeout=timeout)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def _menu_delete(tab, more_button) -> bool:
+    """Open a ⋮ menu, pick its delete entry and confirm; False if none."""
+    await more_button.click()
+    await tab.wait_for("[role='menuitem']", timeout=5)
+    if not await tab.evaluate(CLICK_DELETE_ITEM_JS):
+        return False
+    await tab.wait_for("mat-dialog-container", timeout=5)
+    return bool(await tab.evaluate(CONFIRM_DIALOG_JS))
+
+
+async def swap_source(tab, notebook: str, md: str, max_sources: int = 20) -> None:
+    """
+    Reuse a persistent notebook: drop its Audio Overview and sources, add
+    `md` as the only source and start a new Audio Overview.
+    """
+    logger.info("⏳  Reusing notebook %s…", notebook)
+    with span("notebooklm.page_load", notebook="persistent"):
+        await tab.get(notebook_url(notebook))
+    await tab.wait_for(AUDIO_BTN, timeout=20)
+
+    with span("notebooklm.clear_notebook") as attrs:
+        if (audio_menu := await _maybe_select(tab, AUDIO_MORE_BTN)) is not None:
+            await _menu_delete(tab, audio_menu)
+        removed = 0
+        while removed < max_sources:
+            more = await _maybe_select(tab, SOURCE_MORE_BTN)
+            if more is None or not await _menu_delete(tab, more):
+                break
+            removed += 1
+            await asyncio.sleep(0.5)  # let the list re-render
+        attrs["sources_removed"] = removed
+    logger.info("✅  Removed %d old source(s).", removed)
+
+    await (await locate(tab, "notebooklm", "add_source")).click()
+    await _add_sources(tab, chunk_markdown(md))
+    await _start_audio_overview(tab)
+
+
 async def existing_notebook(tab):
     # For debugging, open an existing notebook
     logger.info("⏳  Opening existing notebook…")
     # ── A. click the “My notebooks” toggle ────────────────────────────
-    my_notebooks_button = await tab.find("My notebooks")
+    my_notebooks_button = await locate(tab, "notebooklm", "my_notebooks")
     await my_notebooks_button.click()
 
     # ── 2. wait until at least one project-button card is in the DOM ───
-    CARD_SEL = "project-button mat-card[role='button']"
-    await tab.wait_for(CARD_SEL, timeout=20_000)
+    CARD_SEL = selector("notebooklm", "notebook_card")
+    await tab.wait_for(CARD_SEL, timeout=20)
 
     # ── 3. click the FIRST tile (top-left = newest by default) ─────────
     first_card = await tab.select(CARD_SEL)
@@ -122,12 +286,12 @@ async def existing_notebook(tab):
     # Click the load button (only when the notebook does already exist)
     # logger.info("⏳  Waiting for the Load button to be enabled…")
     # LOAD_BTN = "button[aria-label='Load the Audio Overview']"  # unique attribute
-    # await tab.wait_for(LOAD_BTN + ":not([disabled])", timeout=60_000)
+    # await tab.wait_for(LOAD_BTN + ":not([disabled])", timeout=60)
     # await (await tab.select(LOAD_BTN)).click()
     # logger.info("✅  Load button clicked.")
 
     # ── 4. wait until the notebook view finishes loading ───────────────
-    await tab.wait_for("button.audio-overview-button", timeout=20_000)
+    await tab.wait_for(AUDIO_BTN, timeout=20)
     logger.info("✅  Existing notebook opened")
 
 
@@ -150,7 +314,7 @@ async def get_notebook_summary(tab) -> str:
     Return the full summary paragraph (including <strong> parts).
     """
     # Wait until the paragraph is in the DOM
-    await tab.wait_for(".summary-content p", timeout=10_000)
+    await tab.wait_for(".summary-content p", timeout=10)
 
     # One-shot JS IIFE → returns full innerText
     # TODO: save with HTML tags like <strong>
@@ -167,8 +331,7 @@ async def get_notebook_summary(tab) -> str:
 
 async def get_title_and_summary(tab):
     # ---- title ----
-    await tab.wait_for("h1.notebook-title", timeout=10_000)
-    title_el = await tab.select("h1.notebook-title")
+    title_el = await locate(tab, "notebooklm", "notebook_title")
     title = await element_text(title_el)
 
     # ---- summary ----
@@ -177,64 +340,172 @@ async def get_title_and_summary(tab):
     return title, summary
 
 
-async def generate_podcast(content: str, debug_mode: bool = False):
-    profile_name = "notebooklm"
-    browser = await start_browser(headless=False, profile_name=profile_name)
-    tab = browser.main_tab
-    temp_dir = Path(tempfile.gettempdir())
+def notebooklm_url() -> str:
+    return site_url("NOTEBOOKLM_URL", "https://notebooklm.google.com")
 
-    await tab.get("https://notebooklm.google.com")
 
-    cookie_store = get_cookies_store(profile_name)
+async def open_notebooklm(browser, tab) -> None:
+    """Navigate to NotebookLM and make sure the session is logged in."""
+    await run_step(
+        "notebooklm.page_load", lambda: tab.get(notebooklm_url()), NAV_TIMEOUT_S
+    )
 
     # first‑run interactive login
-    await first_run_login(browser, tab, cookie_store)
+    await first_run_login(browser, tab, get_cookies_store("notebooklm"))
+
+    # Logged-out sessions get bounced to accounts.google.com
+    host = urllib.parse.urlparse(tab.url).netloc
+    if host != urllib.parse.urlparse(notebooklm_url()).netloc:
+        raise LoginRequiredError(
+            f"NotebookLM session is not logged in (landed on {host})"
+        )
+    logger.info("✅  NotebookLM ready.")
+
+
+async def create_podcast(
+    tab,
+    content: str,
+    debug_mode: bool = False,
+    notebook: str | None = None,
+    on_created: Callable[[str], None] | None = None,
+):
+    """
+    Turn `content` into an Audio Overview in an opened NotebookLM tab, in a
+    new notebook or, with `notebook`, by swapping that notebook's source.
+    `on_created` gets the URL of a new notebook as soon as it exists. A
+    retry swaps the source of that notebook instead of creating another.
+    """
+    created: list[str] = []
+
+    def track(url: str) -> None:
+        created.append(url)
+        if on_created is not None:
+            on_created(url)
+
+    async def build() -> None:
+        if debug_mode:  # Debugging: use existing notebook
+            await existing_notebook(tab)
+        elif notebook or created:
+            await swap_source(tab, notebook or created[-1], content)
+        else:
+            # Create a new notebook
+            await new_notebook(tab, content, on_created=track)
+
+    async def back_home() -> None:
+        await tab.get(notebooklm_url())
+
+    await run_step(
+        "notebooklm.notebook",
+        build,
+        NOTEBOOK_TIMEOUT_S,
+        recover=[back_home],
+        debug=debug_mode,
+        reuse=bool(notebook),
+    )
+    return await finish_podcast(tab)
 
-    # Use latest reply as content, if content is None
-    if content is None:
-        content = (temp_dir / "latest_reply.md").read_text()
 
-    # Debugging: use existing notebook
-    if debug_mode:
-        await existing_notebook(tab)
-    else:
-        # Create a new notebook
-        await new_notebook(tab, content)
+async def finish_podcast(tab):
+    """
+    Wait for the Audio Overview of the notebook open in `tab` and download
+    it. A failed wait or download reloads the notebook and tries again; the
+    generation itself keeps running on NotebookLM's side.
+    """
+    reload_notebook = reload_tab(tab, AUDIO_BTN)
+    menu_ready = AUDIO_MORE_BTN + ":not([disabled])"
 
-    # Wait until the "Audio Overview" button is enabled
+    # Wait until the audio controls menu is enabled
     logger.info("⏳  Waiting for the audio controls menu to appear…")
-    menu_button = "button.artifact-more-button"
-    # Wait for the button to be ready
-    await tab.wait_for(menu_button + ":not([disabled])", timeout=300_000)
-    await (await tab.select(menu_button)).click()
-    logger.info("✅  Menu opened.")
-
-    logger.info("⏳  Looking for the download button")
-    # Find the download button
-    await (await tab.find("download")).click()
-    logger.info("✅  Download triggered.")
+    await run_step(
+        "notebooklm.audio_generation",
+        lambda: tab.wait_for(menu_ready, timeout=GENERATION_TIMEOUT_S),
+        GENERATION_TIMEOUT_S,
+        retries=1,
+        recover=[reload_notebook],
+    )
 
-    # Get the title
-    logger.info("⏳  Looking for the notebook title and summary")
-    title, summary = await get_title_and_summary(tab)
-    logger.info("✅  Got notebook title and summary.")
+    async def fetch() -> tuple[str, str, Path]:
+        await (await tab.wait_for(menu_ready, timeout=30)).click()
+        logger.info("✅  Menu opened.")
+        return await _download_audio(tab)
+
+    async with _download_lock(tab):
+        return await run_step(
+            "notebooklm.fetch_audio",
+            fetch,
+            FETCH_TIMEOUT_S,
+            STEP_RETRIES,
+            recover=[reload_notebook],
+        )
+
+
+async def _download_audio(tab):
+    # Route this tab's downloads into a private per-run directory
+    watcher = await DownloadWatcher().attach(tab)
+    try:
+        logger.info("⏳  Looking for the download button")
+        # Find the download button
+        await (await locate(tab, "notebooklm", "download")).click()
+        logger.info("✅  Download triggered.")
+
+        # Get the title
+        logger.info("⏳  Looking for the notebook title and summary")
+        with span("notebooklm.metadata"):
+            title, summary = await get_title_and_summary(tab)
+        logger.info("✅  Got notebook title and summary.")
+
+        logger.info("⏳  Waiting for the download to finish…")
+        with span("notebooklm.download") as attrs:
+            audio_path = await watcher.wait(TIMEOUT_S)
+            attrs["bytes"] = audio_path.stat().st_size
+        logger.info("✅  Download ready → %s", audio_path)
+    finally:
+        await watcher.detach()
 
-    # # 1️⃣  You click the "Download" link in NotebookLM here …
-    logger.info("⏳  Waiting for the download to finish…")
-    audio_path = await wait_for_download(DOWNLOAD_DIR, TIMEOUT_S)
-    logger.info("✅  Download ready → %s", audio_path)
+    return title, summary, audio_path
 
-    # Optional: head back to overview
-    # Delete the last notebook
 
-    # Stop browser
-    await browser.stop()
+# ───────── parallel generation ─────────
+class GenerationQueue:
+    """
+    The bounded NotebookLM queue shared by the runs of a batch or backfill.
+
+    Each run generates in its own tab of the pooled NotebookLM browser, so
+    notebooks are produced in parallel and every run moves on to its audio
+    and upload stages as soon as its own download is done. At most
+    `parallelism` runs hold a NotebookLM session at a time (one with a
+    persistent notebook), and a job that exceeds `job_timeout_s` fails only
+    its own run.
+    """
 
-    # Save the title and summary in /temp
-    (temp_dir / "notebook_title.txt").write_text(title or "")
-    (temp_dir / "notebook_summary.txt").write_text(summary or "")
+    def __init__(self, parallelism: int = 3, job_timeout_s: float = JOB_TIMEOUT_S):
+        # a persistent notebook holds one source at a time
+        self.parallelism = 1 if persistent_notebook() else parallelism
+        self.job_timeout_s = job_timeout_s
+        self._slots = asyncio.Semaphore(self.parallelism)
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        """Wait for a free slot; the time spent queued is recorded."""
+        queued = time.perf_counter()
+        async with self._slots:
+            record("notebooklm.queue_wait", time.perf_counter() - queued, key=key)
+            with span("notebooklm.queue_job", key=key):
+                yield self
+
+
+async def generate_podcast(
+    content: str, debug_mode: bool = False, pool: BrowserPool | None = None
+):
+    # Use latest recorded reply as content, if content is None
+    if content is None:
+        content = RunStore().latest("markdown")
 
-    return title, summary, audio_path
+    async with browser_session("notebooklm", pool) as (browser, tab):
+        await open_notebooklm(browser, tab)
+        return await create_podcast(
+            tab, content, debug_mode, notebook=persistent_notebook()
+        )
 
 
 if __name__ == "__main__":
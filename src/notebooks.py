@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from metrics import span
+from notebooklm_gen import (
+    CONFIRM_DIALOG_JS,
+    CLICK_DELETE_ITEM_JS,
+    notebook_id,
+    notebooklm_url,
+    open_notebooklm,
+    persistent_notebook,
+)
+from utils import browser_session
+
+NOTEBOOKS_FILE = Path.cwd() / "notebooks.json"
+RETENTION_S = 7 * 24 * 3600  # delete archived notebooks after a week
+
+# Locate the ⋮ button of a notebook card on the home page by notebook ID
+CARD_MENU_JS = """
+(() => {
+    const card = document.querySelector(%(sel)s)?.closest('project-button');
+    const more = card?.querySelector(
+        "button[aria-label*='more' i], button.project-button-more");
+    more?.click();
+    return !!more;
+})()
+"""
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class NotebookRecord:
+    notebook_id: str
+    url: str
+    created_at: float
+    run_id: str | None = None
+    uploaded_at: float | None = None
+
+
+def after_upload_policy() -> str:
+    """NOTEBOOK_AFTER_UPLOAD: "delete" (default) or "archive" until retention."""
+    load_dotenv()
+    return os.getenv("NOTEBOOK_AFTER_UPLOAD", "delete").strip().lower()
+
+
+class NotebookRegistry:
+    """
+    Notebooks this pipeline created, so they can be cleaned up later.
+
+    A notebook is due for deletion once its episode was uploaded (policy
+    "delete") or once it is older than `retention_s` (policy "archive", and
+    notebooks whose run never finished). The persistent notebook is never
+    recorded.
+    """
+
+    def __init__(self, path: Path = NOTEBOOKS_FILE, retention_s: float = RETENTION_S):
+        self.path = path
+        self.retention_s = retention_s
+
+    def _load(self) -> dict[str, NotebookRecord]:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {key: NotebookRecord(**value) for key, value in raw.items()}
+
+    def _save(self, records: dict[str, NotebookRecord]) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({k: asdict(v) for k, v in records.items()}, indent=2),
+            encoding="utf-8",
+        )
+        tmp.replace(self.path)
+
+    def record(self, url: str, run_id: str | None = None) -> str | None:
+        """Remember the notebook at `url`; returns its ID."""
+        nid = notebook_id(url)
+        persistent = persistent_notebook()
+        if nid is None or (persistent and nid in persistent):
+            return None
+        records = self._load()
+        records[nid] = NotebookRecord(nid, url, time.time(), run_id)
+        self._save(records)
+        return nid
+
+    def mark_uploaded(self, nid: str | None) -> None:
+        records = self._load()
+        if nid in records:
+            records[nid].uploaded_at = time.time()
+            self._save(records)
+
+    def forget(self, nid: str) -> None:
+        records = self._load()
+        if records.pop(nid, None) is not None:
+            self._save(records)
+
+    def due(self, now: float | None = None) -> list[NotebookRecord]:
+        now = now or time.time()
+        delete_uploaded = after_upload_policy() == "delete"
+        return [
+            r
+            for r in self._load().values()
+            if (delete_uploaded and r.uploaded_at is not None)
+            or now - r.created_at > self.retention_s
+        ]
+
+
+async def delete_notebook(tab, nid: str) -> bool:
+    """Delete notebook `nid` from the NotebookLM home page."""
+    selector = json.dumps(
+        f"[id*='{nid}'], [href*='{nid}'], [aria-labelledby*='{nid}']"
+    )
+    if not await tab.evaluate(CARD_MENU_JS % {"sel": selector}):
+        return False
+    await tab.wait_for("[role='menuitem']", timeout=5)
+    if not await tab.evaluate(CLICK_DELETE_ITEM_JS):
+        return False
+    await tab.wait_for("mat-dialog-container", timeout=5)
+    return bool(await tab.evaluate(CONFIRM_DIALOG_JS))
+
+
+async def sweep(tab, registry: NotebookRegistry | None = None, limit: int = 5) -> int:
+    """
+    Delete up to `limit` notebooks that are due, from an open NotebookLM home
+    page; returns how many were deleted. Failures are logged, never raised.
+    """
+    registry = registry or NotebookRegistry()
+    # Most recent uploads first, so a run reliably deletes its own notebook
+    due = sorted(registry.due(), key=lambda r: r.uploaded_at or 0, reverse=True)
+    due = due[:limit]
+    if not due:
+        return 0
+    try:
+        await tab.wait_for("project-button", timeout=20)
+    except asyncio.TimeoutError:
+        logger.warning("Notebook list did not render; skipping cleanup")
+        return 0
+    deleted = 0
+    with span("notebooklm.sweep", due=len(due)) as attrs:
+        for record in due:
+            try:
+                if await delete_notebook(tab, record.notebook_id):
+                    deleted += 1
+                    registry.forget(record.notebook_id)
+                    await asyncio.sleep(1)  # let the card list re-render
+                    continue
+                logger.warning(
+                    "Notebook %s not found on the home page", record.notebook_id
+                )
+                if time.time() - record.created_at > registry.retention_s:
+                    registry.forget(record.notebook_id)  # deleted by hand
+            except Exception as e:
+                logger.warning(
+                    "Could not delete notebook %s: %r", record.notebook_id, e
+                )
+                break
+        attrs["deleted"] = deleted
+    await tab.get(notebooklm_url())  # back to a clean home page
+    logger.info("🧹  Deleted %d old notebook(s).", deleted)
+    return deleted
+
+
+async def cleanup(limit: int) -> int:
+    """Open NotebookLM and delete up to `limit` notebooks that are due."""
+    async with browser_session("notebooklm") as (browser, tab):
+        await open_notebooklm(browser, tab)
+        return await sweep(tab, limit=limit)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Delete uploaded or expired notebooks this pipeline created"
+    )
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s"
+    )
+    print(f"{asyncio.run(cleanup(args.limit))} notebook(s) deleted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import metrics
+from artifacts import RunStore
+from audio import AudioValidationError, check_and_prepare
+from cache import DuplicatePublishError, PodcastCache, content_hash
+from chatgpt_pull import get_latest_reply, parse_reply, record_chatgpt
+from notebooklm_gen import (
+    GenerationQueue,
+    create_podcast,
+    finish_podcast,
+    open_notebooklm,
+    persistent_notebook,
+)
+from notebooks import NotebookRegistry, sweep
+from spotify_upload import (
+    PublishUnconfirmedError,
+    open_episode_wizard,
+    publish_episode,
+)
+from steps import StepFailed, tab_alive
+from utils import BrowserPool, browser_session
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Record wall-clock spans of (possibly overlapping) pipeline stages."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: list[tuple[str, float, float]] = []
+
+    @asynccontextmanager
+    async def span(self, name: str):
+        start = time.perf_counter() - self.t0
+        try:
+            with metrics.span(f"stage.{name}"):
+                yield
+        finally:
+            self.spans.append((name, start, time.perf_counter() - self.t0))
+
+    def report(self) -> None:
+        wall = time.perf_counter() - self.t0
+        for name, start, end in sorted(self.spans, key=lambda s: s[1]):
+            logger.info(
+                "⏱️  %-24s %7.1f → %7.1f s  (%6.1f s)", name, start, end, end - start
+            )
+        serial = sum(end - start for _, start, end in self.spans)
+        logger.info(
+            "⏱️  wall clock %.1f s, serial stage time %.1f s, overlap saved %.1f s",
+            wall,
+            serial,
+            serial - wall,
+        )
+
+
+@dataclass
+class Run:
+    """State shared by the stages of one pipeline run."""
+
+    run_id: str
+    store: RunStore
+    pool: BrowserPool | None
+    timer: StageTimer
+    conversation: str | None = None  # default: conversation_id from the .env
+    show: str | None = None  # Spotify show ID; default: the dashboard's show
+    notebooklm_queue: GenerationQueue | None = None  # shared by a batch
+    spotify_slots: asyncio.Semaphore | None = None
+
+    def done(self, stage: str) -> bool:
+        return self.store.stage_done(self.run_id, stage)
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        """Record the status of `name` in the store around its work."""
+        self.store.start_stage(self.run_id, name)
+        try:
+            yield
+        except BaseException as e:
+            self.store.finish_stage(self.run_id, name, error=repr(e))
+            raise
+        self.store.finish_stage(self.run_id, name)
+
+
+# ───────── stages ─────────
+async def chatgpt_stage(run: Run):
+    if run.done("chatgpt"):
+        logger.info("⏭️  chatgpt already done in run %s", run.run_id)
+        return tuple(
+            run.store.get(run.run_id, name)
+            for name in ("markdown", "gpt_title", "gpt_description")
+        )
+
+    async with run.stage("chatgpt"), run.timer.span("chatgpt"):
+        md, title, description = await get_latest_reply(
+            pool=run.pool, cid=run.conversation
+        )
+        record_chatgpt(run.store, run.run_id, md, title, description)
+    return md, title, description
+
+
+async def notebooklm_stage(run: Run, reply: asyncio.Task):
+    if run.done("notebooklm"):
+        logger.info("⏭️  notebooklm already done in run %s", run.run_id)
+        return (
+            run.store.get(run.run_id, "notebook_title"),
+            run.store.get(run.run_id, "notebook_summary"),
+            Path(run.store.get(run.run_id, "audio")),
+        )
+
+    cache = PodcastCache()
+    queue = run.notebooklm_queue
+    async with run.stage("notebooklm"), (
+        queue.slot(run.run_id) if queue else nullcontext()
+    ), browser_session("notebooklm", run.pool) as (browser, tab):
+        # Launch + login while ChatGPT is still polling
+        async with run.timer.span("notebooklm.open"):
+            await open_notebooklm(browser, tab)
+        async with run.timer.span("notebooklm.wait_for_reply"):
+            md, _, _ = await reply
+
+        key = content_hash(md)
+        if (entry := cache.get(key)) is not None:
+            logger.info(
+                "♻️  Reply unchanged (%s…); reusing cached audio", key[:12]
+            )
+            title, summary, wav = entry.title, entry.summary, cache.checkout(entry)
+        else:
+            async with run.timer.span("notebooklm.generate"):
+                title, summary, wav = await asyncio.wait_for(
+                    _generate(run, tab, md), queue.job_timeout_s if queue else None
+                )
+            cache.put(key, title, summary, wav)
+
+        run.store.put_text(run.run_id, "notebook_title", title)
+        run.store.put_text(run.run_id, "notebook_summary", summary)
+        wav = run.store.put_file(run.run_id, "audio", wav)
+    return title, summary, wav
+
+
+async def _generate(run: Run, tab, md: str) -> tuple[str, str, Path]:
+    """
+    Create the podcast in `tab`. A new notebook is recorded in the notebook
+    registry as soon as it exists, so it is cleaned up even if generation
+    fails. If a step fails because the browser died, continue in a relaunched
+    one. A notebook that was already created is reused rather than created
+    again.
+    """
+    created: list[str] = []
+
+    def track(url: str) -> None:
+        created.append(url)
+        if nid := NotebookRegistry().record(url, run.run_id):
+            run.store.put_text(run.run_id, "notebook_id", nid)
+
+    try:
+        return await create_podcast(
+            tab, md, notebook=persistent_notebook(), on_created=track
+        )
+    except StepFailed as e:
+        if await tab_alive(tab):
+            raise
+        logger.warning("🔁  NotebookLM browser died during %s; relaunching", e.step)
+        generating = e.step != "notebooklm.notebook"
+    async with browser_session("notebooklm", run.pool) as (browser, tab):
+        await open_notebooklm(browser, tab)
+        if created and generating:
+            await tab.get(created[-1])
+            return await finish_podcast(tab)
+        # Not generating yet: fill in the notebook that exists, if any
+        notebook = created[-1] if created else persistent_notebook()
+        return await create_podcast(tab, md, notebook=notebook)
+
+
+async def audio_stage(run: Run, podcast: asyncio.Task) -> Path:
+    """
+    Reject broken downloads and apply the optional audio processing. A
+    rejected podcast is dropped from the cache and its NotebookLM stage is
+    reset, so a resume generates it again.
+    """
+    if run.done("audio"):
+        logger.info("⏭️  audio already done in run %s", run.run_id)
+        return Path(run.store.get(run.run_id, "audio"))
+
+    _, _, wav = await podcast
+    try:
+        async with run.stage("audio"), run.timer.span("audio"):
+            audio = await asyncio.to_thread(check_and_prepare, wav)
+            if audio != wav:
+                audio = run.store.put_file(run.run_id, "audio", audio)
+    except AudioValidationError:
+        # The stage has recorded why; neither a resume nor the next run with
+        # this reply may reuse the file
+        PodcastCache().discard(content_hash(run.store.get(run.run_id, "markdown")))
+        run.store.reset_stages(run.run_id, "notebooklm")
+        raise
+    return audio
+
+
+async def spotify_stage(
+    run: Run, reply: asyncio.Task, podcast: asyncio.Task, audio: asyncio.Task
+) -> None:
+    if run.done("spotify"):
+        logger.info("⏭️  spotify already done in run %s", run.run_id)
+        return
+
+    publish_at = run.store.get(run.run_id, "publish_at")  # set by backfills
+    publish_at = datetime.fromisoformat(publish_at) if publish_at else None
+    async with run.stage("spotify"), run.spotify_slots or nullcontext(), (
+        browser_session("spotify", run.pool)
+    ) as (browser, tab):
+        if clicked := run.store.get(run.run_id, "publish_clicked"):
+            raise PublishUnconfirmedError(
+                f"Publish was clicked at {clicked} but never confirmed; check the "
+                "show's episodes, then redo the spotify stage if it is missing"
+            )
+        async with run.timer.span("spotify.open"):
+            await open_episode_wizard(browser, tab, run.show)
+        async with run.timer.span("spotify.wait_for_audio"):
+            md, title, description = await reply
+            title2, description2, _ = await podcast
+            wav = await audio
+        async with run.timer.span("spotify.publish"):
+            # Use the NotebookLM title + description as fallback
+            episode = (
+                title or title2,
+                description or description2,
+                wav,
+                content_hash(md),
+                publish_at,
+            )
+            try:
+                await _publish(run, tab, episode)
+            except DuplicatePublishError as e:
+                logger.warning("⏭️  %s; skipping upload", e)
+                wav.unlink(missing_ok=True)
+    NotebookRegistry().mark_uploaded(run.store.get(run.run_id, "notebook_id"))
+    await _tidy_notebooks(run)
+
+
+async def _publish(run: Run, tab, episode: tuple) -> None:
+    """
+    Publish `episode` in `tab`. If the browser died while the wizard was
+    being filled in, start over in a relaunched one. Nothing was published
+    at that point, and the publish click itself is never repeated: it is
+    recorded as `publish_clicked`, which stops later attempts of the run.
+    """
+
+    def clicked() -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        run.store.put_text(run.run_id, "publish_clicked", now)
+
+    try:
+        return await publish_episode(tab, *episode, on_click=clicked)
+    except StepFailed as e:
+        if e.step != "spotify.fill_in" or await tab_alive(tab):
+            raise
+        logger.warning("🔁  Spotify browser died during %s; relaunching", e.step)
+    async with browser_session("spotify", run.pool) as (browser, tab):
+        await open_episode_wizard(browser, tab, run.show)
+        await publish_episode(tab, *episode, on_click=clicked)
+
+
+async def _tidy_notebooks(run: Run) -> None:
+    """
+    Delete the notebooks that are due, the run's own one first once its
+    episode is uploaded (NOTEBOOK_AFTER_UPLOAD=delete). Never fails the run.
+    """
+    registry = NotebookRegistry()
+    if not registry.due():
+        return
+    try:
+        async with run.timer.span("notebooklm.cleanup"), browser_session(
+            "notebooklm", run.pool
+        ) as (browser, tab):
+            await open_notebooklm(browser, tab)
+            await sweep(tab, registry)
+    except Exception as e:
+        logger.warning("Notebook cleanup failed: %r", e)
+
+
+def new_run_for_message(store: RunStore, message_id: str, markdown: str) -> str:
+    """
+    Start a run whose ChatGPT stage is already satisfied by `markdown`.
+    Raises ValueError, before any run is created, if the reply has no
+    usable JSON block.
+    """
+    title, description = parse_reply(markdown)
+    run_id = store.new_run()
+    store.start_stage(run_id, "chatgpt")
+    record_chatgpt(store, run_id, markdown, title, description)
+    store.put_text(run_id, "message_id", message_id)
+    store.finish_stage(run_id, "chatgpt")
+    return run_id
+
+
+def open_run(
+    store: RunStore,
+    run_id: str | None,
+    conversation: str | None = None,
+    show: str | None = None,
+) -> tuple[str, str | None, str | None]:
+    """Create or resolve a run and persist (or restore) its conversation and show."""
+    if run_id is None:
+        run_id = store.new_run()
+    else:
+        run_id = store.resolve(run_id)
+        logger.info(
+            "🔁  Resuming run %s at stage %s", run_id, store.first_incomplete(run_id)
+        )
+    conversation = conversation or store.get(run_id, "conversation_id") or None
+    show = show or store.get(run_id, "show") or None
+    if conversation:
+        store.put_text(run_id, "conversation_id", conversation)
+    if show:
+        store.put_text(run_id, "show", show)
+    return run_id, conversation, show
+
+
+async def execute(run: Run) -> str:
+    """Run the three stages of `run` concurrently and record the outcome."""
+    run_metrics = metrics.start_run(run.run_id)
+
+    reply = asyncio.create_task(chatgpt_stage(run))
+    podcast = asyncio.create_task(notebooklm_stage(run, reply))
+    audio = asyncio.create_task(audio_stage(run, podcast))
+    upload = asyncio.create_task(spotify_stage(run, reply, podcast, audio))
+    tasks = [reply, podcast, audio, upload]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # let the stages close their browsers before propagating
+        await asyncio.gather(*tasks, return_exceptions=True)
+        run.store.set_run_status(run.run_id, "failed")
+        run_metrics.export("failed")
+        logger.error(
+            "Run %s failed; resume with: main.py --resume %s", run.run_id, run.run_id
+        )
+        raise
+    finally:
+        run.timer.report()
+        metrics.end_run(run_metrics)
+    run.store.set_run_status(run.run_id, "done")
+    run_metrics.export("ok")
+    return run.run_id
+
+
+async def run_once(
+    pool: BrowserPool | None = None,
+    run_id: str | None = None,
+    conversation: str | None = None,
+    show: str | None = None,
+) -> str:
+    """
+    Run the pipeline as a small dependency graph and return its run ID.
+
+    All three browsers start at once; NotebookLM and Spotify only block on the
+    data they need, so their launch, page load and login overlap ChatGPT.
+    Passing an existing `run_id` resumes it: stages already recorded as done
+    are served from the artifact store without opening a browser, and the
+    run's conversation and show are reused unless given explicitly.
+    """
+    store = RunStore()
+    run_id, conversation, show = open_run(store, run_id, conversation, show)
+    return await execute(Run(run_id, store, pool, StageTimer(), conversation, show))
+
+
+@dataclass
+class BatchResult:
+    runs: dict[str, str] = field(default_factory=dict)  # episode name → run ID
+    failed: dict[str, str] = field(default_factory=dict)  # episode name → error
+    wall_s: float = 0.0
+
+    @property
+    def episodes_per_hour(self) -> float:
+        done = len(self.runs) - len(self.failed)
+        return done * 3600 / self.wall_s if self.wall_s else 0.0
+
+
+async def run_batch(
+    episodes: dict[str, tuple[str, str | None]],
+    pool: BrowserPool | None = None,
+    notebooklm_workers: int = 2,
+) -> BatchResult:
+    """
+    Produce one episode per `name → (conversation, show)` entry, e.g. per
+    scheduled job; several episodes may share a conversation.
+
+    Every episode is its own run. ChatGPT replies are fetched concurrently in
+    tabs of one pooled browser, at most `notebooklm_workers` notebooks
+    generate at a time and each upload goes to its run's show. A failed
+    episode is recorded (and can be resumed) without cancelling the others.
+    """
+    own_pool = pool is None
+    pool = pool or BrowserPool()
+    store = RunStore()
+    queue = GenerationQueue(notebooklm_workers)
+    result = BatchResult()
+    started = time.perf_counter()
+
+    async def episode(name: str, conversation: str, show: str | None) -> None:
+        run_id, _, _ = open_run(store, None, conversation, show)
+        result.runs[name] = run_id
+        run = Run(run_id, store, pool, StageTimer(), conversation, show, queue)
+        try:
+            await execute(run)
+        except Exception as e:
+            result.failed[name] = repr(e)
+
+    try:
+        await asyncio.gather(
+            *(episode(name, c, s) for name, (c, s) in episodes.items())
+        )
+    finally:
+        result.wall_s = time.perf_counter() - started
+        if own_pool:
+            await pool.close()
+    logger.info(
+        "📦  Batch: %d/%d episodes in %.1f s (%.1f episodes/hour)",
+        len(result.runs) - len(result.failed),
+        len(episodes),
+        result.wall_s,
+        result.episodes_per_hour,
+    )
+    for name, error in result.failed.items():
+        logger.error("Episode %s failed: %s", name, error)
+    return result
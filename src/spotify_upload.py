@@ -1,113 +1,371 @@
+import asyncio
+import contextlib
+import json
 import logging
-import tempfile
+import os
+import time
+import urllib.parse
+from collections.abc import Callable
 from datetime import datetime, timezone
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # from nodriver import loop
-from zendriver import loop
+from zendriver import cdp, loop
+
+from artifacts import RunStore
+from cache import DuplicatePublishError, PodcastCache
+from downloads import DOWNLOAD_ROOT, last_download
+from locators import locate, selector
+from metrics import span
+from steps import STEP_RETRIES, reopen, run_step
+from utils import (
+    BrowserPool,
+    LoginRequiredError,
+    browser_session,
+    first_run_login,
+    get_cookies_store,
+    inject_text,
+    site_url,
+    wait_for_condition,
+)
+
+PUBLISH_SEL = selector("spotify", "publish")
+FILE_INPUT_SEL = selector("spotify", "file_input")
+MIN_UPLOAD_BPS = 256 * 1024  # slowest uplink we still wait for
+UPLOAD_BASE_S = 60  # fixed part of the upload deadline
+STALL_S = 120  # fail if a shown progress bar does not move for this long
+CONFIRM_TIMEOUT_S = 60
+NAV_TIMEOUT_S = 60
+FORM_TIMEOUT_S = 120  # filling in the wizard, on top of the upload deadline
 
-from utils import first_run_login, get_cookies_store, start_browser
+# Upload fraction from the wizard's progress bar, or null if there is none
+PROGRESS_JS = """
+(() => {
+    const bar = document.querySelector("[role='progressbar']");
+    if (!bar) return null;
+    const now = parseFloat(bar.getAttribute('aria-valuenow'));
+    const max = parseFloat(bar.getAttribute('aria-valuemax') || '100');
+    return isNaN(now) ? null : now / max;
+})()
+"""
+PUBLISHED_JS = (
+    "!location.pathname.includes('/wizard') || "
+    "/episode (was )?(published|scheduled)/i.test(document.body.innerText)"
+)
 
 logger = logging.getLogger(__name__)
 
 
-def read_nonempty(p: Path) -> str:
-    try:
-        return p.read_text(encoding="utf-8").strip()
-    except FileNotFoundError:
-        return ""
+class PublishUnconfirmedError(RuntimeError):
+    """An earlier attempt clicked Publish but never saw it confirmed."""
+
+
+def default_title() -> str:
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return f"MarketMind Daily Podcast of {today}"
 
 
 def latest_audio(downloads: Path | None = None) -> Path:
-    """Return newest .wav or .m4a in the folder (default: ~/Downloads)."""
+    """
+    Return the file of the last NotebookLM download, or else the newest
+    audio file in `downloads` (default: ~/Downloads).
+    """
+    if downloads is None and (path := last_download()) is not None:
+        return path
+
     downloads = downloads or (Path.home() / "Downloads")
     candidates = [
         p
         for p in downloads.iterdir()
-        if p.is_file() and p.suffix.lower() in {".wav", ".m4a"}
+        if p.is_file() and p.suffix.lower() in {".wav", ".m4a", ".mp3"}
     ]
     if not candidates:
-        raise FileNotFoundError("No .wav or .m4a files found in Downloads")
+        raise FileNotFoundError("No .wav, .m4a or .mp3 files found in Downloads")
     return max(candidates, key=lambda p: p.stat().st_mtime)
 
 
-async def upload_podcast(title: str, summary: str, audio_path: Path):
-    profile_name = "spotify"
-    browser = await start_browser(profile_name=profile_name)
-    tab = browser.main_tab
-    temp_dir = Path(tempfile.gettempdir())
+def wizard_url(show: str | None = None) -> str:
+    """Return the new-episode wizard, for a specific show ID if given."""
+    url = site_url(
+        "SPOTIFY_WIZARD_URL",
+        "https://creators.spotify.com/pod/dashboard/episode/wizard",
+    )
+    if show:
+        url = url.replace("/pod/dashboard/", f"/pod/show/{show}/")
+    return url
 
-    await tab.get("https://creators.spotify.com/pod/dashboard/episode/wizard")
 
-    # Get the cookies store
-    cookie_store = get_cookies_store(profile_name=profile_name)
+async def open_episode_wizard(browser, tab, show: str | None = None) -> None:
+    """Open the new-episode wizard and wait until it accepts a file."""
+    await run_step(
+        "spotify.page_load", lambda: tab.get(wizard_url(show)), NAV_TIMEOUT_S
+    )
 
     # first‑run interactive login
-    await first_run_login(browser, tab, cookie_store)
+    await first_run_login(browser, tab, get_cookies_store(profile_name="spotify"))
 
     # In some cases we need to click the "Continue with Spotify" button
     try:
-        el = await tab.find("Continue with Spotify", timeout=2500)
+        el = await locate(tab, "spotify", "continue_with_spotify", timeout=2.5)
         await el.click()
-        logger.info("Clicked 'Continue with Spotify' (text match).")
+        logger.info("Clicked 'Continue with Spotify'.")
     except Exception:
         pass
 
+    # The file input only renders for a logged-in session
+    with span("spotify.wizard_ready"):
+        try:
+            await tab.wait_for(FILE_INPUT_SEL, timeout=30)
+        except asyncio.TimeoutError:
+            host = urllib.parse.urlparse(tab.url).netloc
+            if host != urllib.parse.urlparse(wizard_url()).netloc:
+                raise LoginRequiredError(
+                    f"Spotify session is not logged in (landed on {host})"
+                ) from None
+            raise
+    logger.info("✅  Spotify episode wizard ready.")
+
+
+def upload_deadline_s(size_bytes: int) -> float:
+    """Time allowed for an upload: a fixed part plus the size at MIN_UPLOAD_BPS."""
+    load_dotenv()
+    min_bps = float(os.getenv("SPOTIFY_MIN_UPLOAD_BPS", MIN_UPLOAD_BPS))
+    return UPLOAD_BASE_S + size_bytes / min_bps
+
+
+class UploadTracker:
+    """
+    Follow an episode upload through the wizard's progress bar and the CDP
+    network events of the upload request; reports bytes/s and ETA.
+    """
+
+    def __init__(self, tab, size_bytes: int):
+        self.tab = tab
+        self.size = size_bytes
+        self.started = time.perf_counter()
+        self.fraction = 0.0
+        self.last_progress: float | None = None  # None until a progress bar shows
+        self.network_s: float | None = None  # duration of the upload request
+        self._requests: dict[str, float] = {}
+
+    def _on_request(self, event: cdp.network.RequestWillBeSent) -> None:
+        if event.request.method in ("PUT", "POST") and "upload" in event.request.url:
+            self._requests[event.request_id] = time.perf_counter()
+
+    def _on_finished(self, event: cdp.network.LoadingFinished) -> None:
+        if (start := self._requests.pop(event.request_id, None)) is not None:
+            self.network_s = time.perf_counter() - start
+            self.fraction = 1.0
+
+    async def attach(self) -> "UploadTracker":
+        await self.tab.send(cdp.network.enable())
+        self.tab.add_handler(cdp.network.RequestWillBeSent, self._on_request)
+        self.tab.add_handler(cdp.network.LoadingFinished, self._on_finished)
+        return self
+
+    def detach(self) -> None:
+        self.tab.remove_handlers(cdp.network.RequestWillBeSent, self._on_request)
+        self.tab.remove_handlers(cdp.network.LoadingFinished, self._on_finished)
+
+    @property
+    def bytes_per_s(self) -> float:
+        elapsed = (self.network_s or time.perf_counter() - self.started) or 1e-9
+        return self.fraction * self.size / elapsed
+
+    @property
+    def eta_s(self) -> float | None:
+        rate = self.bytes_per_s
+        return (1 - self.fraction) * self.size / rate if rate else None
+
+    async def _sample(self) -> None:
+        fraction = await self.tab.evaluate(PROGRESS_JS)
+        if fraction is not None and (
+            self.last_progress is None or fraction > self.fraction
+        ):
+            self.fraction = max(self.fraction, min(float(fraction), 1.0))
+            self.last_progress = time.perf_counter()
+
+    async def wait_ready(self, selector: str, poll_s: float = 1.0) -> None:
+        """
+        Wait until `selector` is enabled, within a size-scaled deadline. The
+        stall check only applies once the wizard showed a progress bar; CDP
+        reports no progress before the upload request finishes.
+        """
+        deadline = self.started + upload_deadline_s(self.size)
+        next_log = 0.0
+        ready_js = (
+            f"!!document.querySelector({json.dumps(selector)} + ':not([disabled])')"
+        )
+        while not await self.tab.evaluate(ready_js):
+            await self._sample()
+            now = time.perf_counter()
+            if now >= next_log:
+                eta = self.eta_s
+                logger.info(
+                    "⏫  %3.0f%% of %.1f MB at %.0f kB/s, ETA %s",
+                    self.fraction * 100,
+                    self.size / 1e6,
+                    self.bytes_per_s / 1e3,
+                    f"{eta:.0f} s" if eta is not None else "?",
+                )
+                next_log = now + 10
+            if now > deadline:
+                raise TimeoutError(
+                    f"Upload not finished after {now - self.started:.0f} s "
+                    f"({self.fraction:.0%} of {self.size / 1e6:.1f} MB)"
+                )
+            if (
+                self.last_progress is not None
+                and self.fraction < 1
+                and now - self.last_progress > STALL_S
+            ):
+                raise TimeoutError(
+                    f"Upload stalled at {self.fraction:.0%} for {STALL_S} s"
+                )
+            await asyncio.sleep(poll_s)
+        self.fraction = 1.0
+
+
+async def schedule_publish(tab, publish_at: datetime) -> None:
+    """Pick the "Schedule" option and enter `publish_at` (local wizard time)."""
+    await (await locate(tab, "spotify", "publish_schedule")).click()
+    field = await locate(tab, "spotify", "schedule_value")
+    value = publish_at.astimezone().strftime("%Y-%m-%dT%H:%M")
+    await inject_text(tab, field, value)
+    logger.info("📅  Scheduled for %s", value)
+
+
+async def _fill_in(
+    tab, title: str, summary: str, audio_path: Path, publish_at: datetime | None
+) -> UploadTracker:
+    """Upload the file, fill in the wizard and wait until the upload is through."""
     # Upload the last .wav file
-    await tab.wait_for("input[type='file']", timeout=10_000)
-    file_input = await tab.select("input[type='file']")  # Element handle
+    file_input = await locate(tab, "spotify", "file_input")  # Element handle
 
     # 3.  inject file *without* opening the OS chooser
-    # TODO: get the lastest .wav of .m4a file (take the most recent of either)
-    await file_input.send_file(audio_path)
-    logger.info("⏫  upload started: %s", audio_path)
-
-    # Fill in the title
-    title = (
-        read_nonempty(temp_dir / "gpt_title.txt")
-        or read_nonempty(temp_dir / "notebook_title.txt")
-        or f"MarketMind Daily Podcast of {datetime.now(timezone.utc).strftime('%Y-%m-%d')}"
-    )
-    textarea = await tab.find("input[name='title']")
-    await textarea.send_keys(title)
-
-    # Click the HTML button for the description
-    btn = await tab.find("HTML")
-    await btn.click()
-
-    # Focus the content-editable box
-    await tab.wait_for("textarea[name='description']", timeout=10_000)
-    box = await tab.find("textarea[name='description']")
-    await box.click()
-
-    # Type the summary
-    summary = (
-        read_nonempty(temp_dir / "gpt_description.txt")
-        or read_nonempty(temp_dir / "notebook_summary.txt")
-        or f"MarketMind Daily Podcast of {datetime.now(timezone.utc).strftime('%Y-%m-%d')}"
-    )
-    await box.send_keys(summary)
-    logger.info("📝  Description field filled")
+    size = audio_path.stat().st_size
+    tracker = await UploadTracker(tab, size).attach()
+    try:
+        with span("spotify.send_file", bytes=size):
+            await file_input.send_file(audio_path)
+        logger.info("⏫  upload started: %s", audio_path)
+
+        # Fill in the title
+        with span("spotify.title"):
+            textarea = await locate(tab, "spotify", "title")
+            await inject_text(tab, textarea, title)
+
+        # Click the HTML button for the description
+        btn = await locate(tab, "spotify", "html_toggle")
+        await btn.click()
 
-    # Click "Next" button (bottom right)
-    await (await tab.find("Next")).click()
+        # Wait for the description box
+        box = await locate(tab, "spotify", "description")
 
-    # wait until the “Now” option is rendered
-    await tab.wait_for("label[for='publish-date-now']", timeout=10_000)
+        # Inject the summary
+        with span("spotify.description", chars=len(summary)):
+            await inject_text(tab, box, summary)
+        logger.info("📝  Description field filled")
 
-    # click the label – automatically selects the underlying radio button
-    await (await tab.select("label[for='publish-date-now']")).click()
+        # Click "Next" button (bottom right)
+        await (await locate(tab, "spotify", "next")).click()
 
-    # Wait for the publish button to be ready
-    PUBLISH_SEL = "button[type='submit'][form='review-form']"
-    await tab.wait_for(PUBLISH_SEL + ":not([disabled])", timeout=60_000)
-    await (await tab.select(PUBLISH_SEL)).click()
+        if publish_at is None:
+            # click the label – automatically selects the underlying radio button
+            await (await locate(tab, "spotify", "publish_now")).click()
+        else:
+            await schedule_publish(tab, publish_at)
 
-    # Remove the .wav file from the local disk
+        # The publish button enables once the upload is through
+        with span("spotify.upload", bytes=size) as attrs:
+            await tracker.wait_ready(PUBLISH_SEL)
+            attrs["bytes_per_s"] = round(tracker.bytes_per_s)
+    finally:
+        tracker.detach()
+    return tracker
+
+
+async def publish_episode(
+    tab,
+    title: str,
+    summary: str,
+    audio_path: Path,
+    content_key: str | None = None,
+    publish_at: datetime | None = None,
+    on_click: Callable[[], None] | None = None,
+) -> None:
+    """
+    Fill in and publish an episode in an opened wizard tab, right away or
+    scheduled for `publish_at`.
+
+    A failed or timed-out fill-in reopens the wizard and starts over. The
+    publish click itself is never repeated; `on_click` runs right before it,
+    so the caller can record the click and refuse to publish again. With a
+    `content_key` (see cache.content_hash) the publish is refused if an
+    episode for the same content was already published.
+    """
+    cache = PodcastCache() if content_key else None
+    if cache is not None and cache.is_published(content_key):
+        raise DuplicatePublishError(
+            f"An episode for content {content_key[:12]}… was already published"
+        )
+
+    if publish_at is not None and publish_at <= datetime.now(timezone.utc):
+        logger.warning("Scheduled date %s has passed; publishing now", publish_at)
+        publish_at = None
+    size = audio_path.stat().st_size
+    tracker = await run_step(
+        "spotify.fill_in",
+        lambda: _fill_in(
+            tab,
+            title or default_title(),
+            summary or default_title(),
+            audio_path,
+            publish_at,
+        ),
+        upload_deadline_s(size) + FORM_TIMEOUT_S,
+        STEP_RETRIES,
+        recover=[reopen(tab, tab.url, FILE_INPUT_SEL)],
+    )
+    logger.info(
+        "✅  Upload done: %.1f MB at %.0f kB/s",
+        size / 1e6,
+        tracker.bytes_per_s / 1e3,
+    )
+
+    with span("spotify.publish_click"):
+        button = await tab.select(PUBLISH_SEL)
+        if on_click is not None:
+            on_click()
+        await button.click()
+    with span("spotify.publish_confirm"):
+        await wait_for_condition(
+            tab, PUBLISHED_JS, CONFIRM_TIMEOUT_S, label="publish confirmation"
+        )
+    logger.info("🚀  Publish confirmed")
+    if cache is not None:
+        cache.mark_published(content_key)
+
+    # Only now remove the file (and its per-run download dir) from the disk
     audio_path.unlink(missing_ok=True)
+    if audio_path.parent.parent == DOWNLOAD_ROOT:
+        with contextlib.suppress(OSError):
+            audio_path.parent.rmdir()
 
-    # Stop browser
-    await browser.stop()
+
+async def upload_podcast(
+    title: str,
+    summary: str,
+    audio_path: Path,
+    pool: BrowserPool | None = None,
+    content_key: str | None = None,
+    publish_at: datetime | None = None,
+):
+    async with browser_session("spotify", pool) as (browser, tab):
+        await open_episode_wizard(browser, tab)
+        await publish_episode(tab, title, summary, audio_path, content_key, publish_at)
 
 
 if __name__ == "__main__":
@@ -116,4 +374,12 @@ if __name__ == "__main__":
         format="%(asctime)s %(levelname)s: %(message)s",
     )
 
-    loop().run_until_complete(upload_podcast(None, None, latest_audio()))
+    # Use the latest recorded ChatGPT / NotebookLM metadata
+    store = RunStore()
+    loop().run_until_complete(
+        upload_podcast(
+            store.latest("gpt_title") or store.latest("notebook_title"),
+            store.latest("gpt_description") or store.latest("notebook_summary"),
+            latest_audio(),
+        )
+    )
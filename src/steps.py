@@ -0,0 +1,110 @@
+"""
+Run UI steps with their own deadline, retry budget and recovery ladder.
+
+A step that times out or fails is retried inside the same run after a
+recovery action. Typical actions reload the tab or reopen the page. The
+work of earlier steps and stages is kept, so one flaky click no longer
+costs the whole run. Every step is a metric span whose `retries` attribute
+counts the extra attempts, so `metrics.py` lists them per step.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Sequence
+from typing import TypeVar
+
+from metrics import span
+from utils import LoginRequiredError
+
+STEP_RETRIES = 2  # default retry budget of a step
+HEALTH_TIMEOUT_S = 5
+
+T = TypeVar("T")
+Recovery = Callable[[], Awaitable[object]]
+
+logger = logging.getLogger(__name__)
+
+
+class StepFailed(Exception):
+    """A step failed on every attempt; `__cause__` is the last error."""
+
+    def __init__(self, step: str, attempts: int, error: BaseException):
+        super().__init__(f"Step {step} failed after {attempts} attempt(s): {error!r}")
+        self.step = step
+        self.attempts = attempts
+
+
+async def run_step(
+    name: str,
+    action: Callable[[], Awaitable[T]],
+    timeout_s: float,
+    retries: int = STEP_RETRIES,
+    recover: Sequence[Recovery] = (),
+    fatal: tuple[type[BaseException], ...] = (LoginRequiredError,),
+    **attrs,
+) -> T:
+    """
+    Await `action()` within `timeout_s`, up to `retries` more times. Before
+    retry n, the n-th action of the `recover` ladder runs (the last one
+    repeats). Errors in `fatal` are raised straight away. Anything else fails
+    the step with StepFailed once the budget is spent.
+    """
+    with span(name, retries=0, **attrs) as step_attrs:
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.wait_for(action(), timeout_s)
+            except fatal:
+                raise
+            except Exception as e:
+                if attempt == retries:
+                    raise StepFailed(name, attempt + 1, e) from e
+                error = e
+            step_attrs["retries"] = attempt + 1
+            recovery = recover[min(attempt, len(recover) - 1)] if recover else None
+            logger.warning(
+                "⚠️  Step %s failed (%r); %s and retrying (%d/%d)",
+                name,
+                error,
+                recovery.__name__ if recovery else "no recovery",
+                attempt + 1,
+                retries,
+            )
+            if recovery is None:
+                continue
+            try:
+                await asyncio.wait_for(recovery(), timeout_s)
+            except fatal:
+                raise
+            except Exception as e:  # the next attempt (or rung) decides
+                logger.warning("Recovery %s failed: %r", recovery.__name__, e)
+
+
+async def tab_alive(tab) -> bool:
+    """True if `tab` (and so its browser) still answers a trivial script."""
+    try:
+        result = await asyncio.wait_for(tab.evaluate("1 + 1"), HEALTH_TIMEOUT_S)
+        return result == 2
+    except Exception:
+        return False
+
+
+def reload_tab(tab, ready_selector: str | None = None) -> Recovery:
+    """Recovery: reload `tab` and wait for `ready_selector`, if given."""
+
+    async def reload_tab():
+        await tab.reload()
+        if ready_selector:
+            await tab.wait_for(ready_selector, timeout=30)
+
+    return reload_tab
+
+
+def reopen(tab, url: str, ready_selector: str | None = None) -> Recovery:
+    """Recovery: navigate `tab` to `url` again, e.g. back to a wizard's start."""
+
+    async def reopen():
+        await tab.get(url)
+        if ready_selector:
+            await tab.wait_for(ready_selector, timeout=30)
+
+    return reopen
@@ -1,10 +1,21 @@
 import asyncio
+import json
 import logging
+import os
 import sys
+import time
+import urllib.parse
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
 
 # import nodriver
 import zendriver as zd
+from dotenv import load_dotenv
+from zendriver import cdp
+
+from blocking import apply_blocking
+from metrics import record, span
 
 EXTRA_ARGS = [
     "--disable-dev-shm-usage",
@@ -21,10 +32,27 @@ EXTRA_ARGS = [
     "--allow-running-insecure-content",
     "--disable-features=ChromeWhatsNewUI",  # keeps the “What’s new” tab closed
 ]
+WINDOW_SIZE = (1920, 1080)  # same layout headed and headless
 
 logger = logging.getLogger(__name__)
 
 
+class LoginRequiredError(RuntimeError):
+    """The stored session is missing or expired and needs an interactive login."""
+
+
+def default_headless() -> bool:
+    """Whether stages run headless by default (HEADLESS=1 in the .env)."""
+    load_dotenv()
+    return os.getenv("HEADLESS", "").strip().lower() in ("1", "true", "yes")
+
+
+def site_url(env_name: str, default: str) -> str:
+    """Return a service URL, overridable from the .env (e.g. for local stand-ins)."""
+    load_dotenv()
+    return os.getenv(env_name, default).rstrip("/")
+
+
 def get_profile_dir(profile_name: str = "chrome_profile") -> Path:
     """Return the path to the Chrome profile directory."""
     return Path.cwd() / profile_name
@@ -39,21 +67,25 @@ def get_cookies_store(
 async def start_browser(
     profile_name: str = "chrome_profile",
     cookies_file: str = "cookies.json",
-    headless: bool = False,
+    headless: bool | None = None,
     max_tries: int = 3,
 ) -> zd.Browser:
     """Launch nodriver with a persistent profile, with retries & cleanup."""
+    if headless is None:
+        headless = default_headless()
     profile_dir = get_profile_dir(profile_name)
     profile_dir.mkdir(parents=True, exist_ok=True)
+    browser_args = EXTRA_ARGS + ["--window-size=%d,%d" % WINDOW_SIZE]
 
     last_exc = None
+    start = time.perf_counter()
     for attempt in range(1, max_tries + 1):
         try:
             browser = await zd.start(
                 headless=headless,
                 no_sandbox=True,  # important when running as root
                 user_data_dir=profile_dir,
-                browser_args=EXTRA_ARGS,
+                browser_args=browser_args,
             )
             # Load cookies if present
             cookies_store = get_cookies_store(profile_name, cookies_file)
@@ -61,7 +93,24 @@ async def start_browser(
                 await browser.cookies.load(cookies_store)
                 logger.info("🔑  Cookies loaded from %s", cookies_store)
 
-            logger.info("✅ Browser started (try %d/%d)", attempt, max_tries)
+            elapsed = time.perf_counter() - start
+            rss = _process_tree_rss_mb(getattr(browser, "_process_pid", None))
+            logger.info(
+                "✅ Browser started (try %d/%d, %s, %.1f s, %s MB RSS)",
+                attempt,
+                max_tries,
+                "headless" if headless else "headed",
+                elapsed,
+                f"{rss:.0f}" if rss is not None else "?",
+            )
+            record(
+                "browser.start",
+                elapsed,
+                profile=profile_name,
+                headless=headless,
+                rss_mb=rss,
+                retries=attempt - 1,
+            )
             return browser
 
         except Exception as e:
@@ -73,24 +122,408 @@ async def start_browser(
             # small backoff (exponential)
             await asyncio.sleep(1.5 * attempt)
 
+    record(
+        "browser.start",
+        time.perf_counter() - start,
+        "error",
+        profile=profile_name,
+        retries=max_tries - 1,
+    )
     raise RuntimeError(f"Failed to start browser after {max_tries} tries: {last_exc}")
 
 
+async def prepare_tab(tab, profile_name: str, headless: bool) -> None:
+    """
+    Apply the profile's resource-blocking policy and make headless tabs
+    present the same user agent as headed Chrome.
+    """
+    await apply_blocking(tab, profile_name)
+    if not headless:
+        return
+    user_agent = os.getenv("BROWSER_USER_AGENT")
+    if not user_agent:
+        *_, user_agent, _ = await tab.send(cdp.browser.get_version())
+        user_agent = user_agent.replace("HeadlessChrome", "Chrome")
+    await tab.send(cdp.network.set_user_agent_override(user_agent=user_agent))
+
+
 async def first_run_login(browser, tab, cookie_store, custom_url=None) -> None:
     if cookie_store.exists():
+        # start_browser already loaded them; nothing to do
         logger.info("Found existing cookies at %s", cookie_store)
-        await browser.cookies.load(cookie_store)
         return
 
+    headless = getattr(browser.config, "headless", False)
+    if headless or not sys.stdin.isatty():
+        # Nobody can log in here: fail now instead of waiting for a human
+        raise LoginRequiredError(
+            f"No saved session at {cookie_store}; "
+            "run `python src/first_time.py` in a headed session first"
+        )
+
     if custom_url:
         await tab.get(custom_url)
 
     logger.info("🔑  First run — log in in the opened window.")
-    if sys.stdin.isatty():
-        logger.info("After logging in, press <ENTER> here.")
-        await asyncio.to_thread(input)
-    else:
-        logger.info("Running headless; this is not yet supported…")
+    logger.info("After logging in, press <ENTER> here.")
+    await asyncio.to_thread(input)
 
     await browser.cookies.save(cookie_store)
     logger.info("✅  Cookies saved to %s", cookie_store)
+
+
+def _process_tree_rss_mb(pid: int | None) -> float | None:
+    """Return the summed RSS (MB) of `pid` and all its descendants (Linux only)."""
+    proc = Path("/proc")
+    if pid is None or not proc.is_dir():
+        return None
+
+    children: dict[int, list[int]] = {}
+    rss_kb: dict[int, int] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            status = (entry / "status").read_text()
+        except OSError:
+            continue  # process exited while we were scanning
+        fields = dict(
+            line.split(":", 1) for line in status.splitlines() if ":" in line
+        )
+        child = int(entry.name)
+        children.setdefault(int(fields.get("PPid", "0").strip()), []).append(child)
+        rss_kb[child] = int(fields.get("VmRSS", "0 kB").split()[0])
+
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss_kb.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total / 1024
+
+
+@dataclass
+class PooledBrowser:
+    """A long-lived Chrome instance for a single profile."""
+
+    browser: zd.Browser
+    profile_name: str
+    started_at: float = field(default_factory=time.monotonic)
+    runs: int = 0
+    tabs: int = 0  # tabs currently handed out; never recycle while > 0
+
+    @property
+    def pid(self) -> int | None:
+        return getattr(self.browser, "_process_pid", None)
+
+
+class BrowserPool:
+    """
+    Keep one warm Chrome per profile and hand out tabs to the pipeline stages.
+
+    Browsers are health-checked before every hand-out and recycled after
+    `max_runs` pipeline runs or once their process tree exceeds `max_rss_mb`.
+    """
+
+    def __init__(
+        self,
+        headless: bool | None = None,
+        max_runs: int = 20,
+        max_rss_mb: float = 1500,
+        health_timeout_s: float = 10,
+    ):
+        self.headless = default_headless() if headless is None else headless
+        self.max_runs = max_runs
+        self.max_rss_mb = max_rss_mb
+        self.health_timeout_s = health_timeout_s
+        self._browsers: dict[str, PooledBrowser] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _lock(self, profile_name: str) -> asyncio.Lock:
+        return self._locks.setdefault(profile_name, asyncio.Lock())
+
+    async def _is_healthy(self, pooled: PooledBrowser) -> bool:
+        try:
+            result = await asyncio.wait_for(
+                pooled.browser.main_tab.evaluate("1 + 1"), self.health_timeout_s
+            )
+            return result == 2
+        except Exception as e:
+            logger.warning("Browser %s failed health check: %s", pooled.profile_name, e)
+            return False
+
+    async def _discard(self, profile_name: str) -> None:
+        pooled = self._browsers.pop(profile_name, None)
+        if pooled is None:
+            return
+        try:
+            await pooled.browser.stop()
+        except Exception as e:
+            logger.debug("Error while stopping %s browser: %s", profile_name, e)
+        logger.info("♻️  Browser %s stopped after %d runs", profile_name, pooled.runs)
+
+    async def acquire(self, profile_name: str) -> zd.Browser:
+        """Return a healthy browser for `profile_name`, starting one if needed."""
+        async with self._lock(profile_name):
+            pooled = self._browsers.get(profile_name)
+            if pooled is not None and not await self._is_healthy(pooled):
+                await self._discard(profile_name)
+                pooled = None
+
+            if pooled is None:
+                browser = await start_browser(
+                    profile_name=profile_name, headless=self.headless
+                )
+                pooled = PooledBrowser(browser, profile_name)
+                self._browsers[profile_name] = pooled
+            return pooled.browser
+
+    @asynccontextmanager
+    async def tab(self, profile_name: str, url: str = "about:blank"):
+        """Open a fresh tab in the pooled browser and close it afterwards."""
+        browser = await self.acquire(profile_name)
+        pooled = self._browsers[profile_name]
+        pooled.tabs += 1
+        try:
+            tab = await browser.get(url, new_tab=True)
+            await prepare_tab(tab, profile_name, self.headless)
+            try:
+                yield browser, tab
+            finally:
+                try:
+                    await tab.close()
+                except Exception as e:
+                    logger.debug("Could not close %s tab: %s", profile_name, e)
+        finally:
+            pooled.tabs -= 1
+
+    async def end_run(self) -> None:
+        """Count a finished pipeline run and recycle worn-out browsers."""
+        for profile_name, pooled in list(self._browsers.items()):
+            pooled.runs += 1
+            if pooled.tabs:
+                continue  # another pipeline is using it; recycle next time
+            rss = _process_tree_rss_mb(pooled.pid)
+            if pooled.runs >= self.max_runs:
+                logger.info(
+                    "Recycling %s browser after %d runs", profile_name, pooled.runs
+                )
+                await self._discard(profile_name)
+            elif rss is not None and rss > self.max_rss_mb:
+                logger.info("Recycling %s browser at %.0f MB RSS", profile_name, rss)
+                await self._discard(profile_name)
+
+    def status(self) -> dict[str, dict]:
+        """Runs served, open tabs and RSS of every warm browser, by profile."""
+        return {
+            profile_name: {
+                "runs": pooled.runs,
+                "tabs": pooled.tabs,
+                "rss_mb": _process_tree_rss_mb(pooled.pid),
+            }
+            for profile_name, pooled in self._browsers.items()
+        }
+
+    async def keep_warm(self) -> None:
+        """Health-check every pooled browser and drop the ones that died."""
+        for profile_name, pooled in list(self._browsers.items()):
+            if not await self._is_healthy(pooled):
+                await self._discard(profile_name)
+
+    async def close(self) -> None:
+        for profile_name in list(self._browsers):
+            await self._discard(profile_name)
+
+
+_WAIT_JS = """
+new Promise((resolve) => {
+    const check = () => { try { return (%(condition)s); } catch (e) { return null; } };
+    const ok = (v) => v !== null && v !== undefined && v !== false;
+    const first = check();
+    if (ok(first)) return resolve(first);
+    let timer;
+    const obs = new MutationObserver(() => {
+        const v = check();
+        if (ok(v)) { obs.disconnect(); clearTimeout(timer); resolve(v); }
+    });
+    obs.observe(document, {
+        childList: true, subtree: true, attributes: true, characterData: true,
+    });
+    timer = setTimeout(() => { obs.disconnect(); resolve(null); }, %(timeout_ms)d);
+})
+"""
+
+
+async def wait_for_condition(
+    tab, condition: str, timeout_s: float = 60, label: str | None = None
+):
+    """
+    Resolve as soon as the JS expression `condition` is truthy in the page.
+
+    The check re-runs on every DOM mutation through an in-page
+    MutationObserver, so there is no polling interval. Navigations that
+    destroy the execution context simply re-arm the observer until the
+    deadline. Returns the (JSON-serialisable) value of `condition`.
+    """
+    label = label or condition
+    start = time.perf_counter()
+    deadline = start + timeout_s
+    rearms = 0
+    while (remaining := deadline - time.perf_counter()) > 0:
+        try:
+            value = await asyncio.wait_for(
+                tab.evaluate(
+                    _WAIT_JS
+                    % {"condition": condition, "timeout_ms": int(remaining * 1000)},
+                    await_promise=True,
+                ),
+                timeout=remaining + 1,
+            )
+        except asyncio.TimeoutError:
+            break
+        except Exception as e:
+            # Page navigated → context destroyed / DOM ids invalid; re-arm
+            logger.debug("Wait for %s interrupted (%s); re-arming", label, e)
+            rearms += 1
+            await asyncio.sleep(0.05)
+            continue
+        if value not in (None, False):
+            elapsed = time.perf_counter() - start
+            logger.info("⏱️  %s after %.2f s", label, elapsed)
+            record(f"wait:{label}", elapsed, retries=rearms)
+            return value
+    record(f"wait:{label}", time.perf_counter() - start, "timeout", retries=rearms)
+    raise TimeoutError(f"{label} not satisfied after {timeout_s}s")
+
+
+async def wait_for_selector(tab, selector: str, timeout_s: float = 60) -> None:
+    """Wait until `selector` matches an element in the page."""
+    await wait_for_condition(
+        tab,
+        f"!!document.querySelector({json.dumps(selector)})",
+        timeout_s,
+        label=f"selector {selector}",
+    )
+
+
+async def wait_for_host(tab, host: str, timeout_s: float = 300) -> None:
+    """Wait until the tab's main frame navigates to `host`, via CDP events."""
+    start = time.perf_counter()
+    landed = asyncio.get_running_loop().create_future()
+
+    def on_navigated(event) -> None:
+        frame = getattr(event, "frame", None)
+        if frame is not None and frame.parent_id is not None:
+            return  # ignore iframes
+        url = frame.url if frame is not None else event.url
+        if urllib.parse.urlparse(url).netloc == host and not landed.done():
+            landed.set_result(url)
+
+    await tab.send(cdp.page.enable())
+    tab.add_handler(cdp.page.FrameNavigated, on_navigated)
+    tab.add_handler(cdp.page.NavigatedWithinDocument, on_navigated)
+    try:
+        if urllib.parse.urlparse(tab.url or "").netloc != host:
+            try:
+                await asyncio.wait_for(landed, timeout_s)
+            except asyncio.TimeoutError:
+                now_on = urllib.parse.urlparse(tab.url or "").netloc
+                raise TimeoutError(
+                    f"Still not on {host} after {timeout_s}s (now on {now_on})"
+                ) from None
+    finally:
+        tab.remove_handlers(cdp.page.FrameNavigated, on_navigated)
+        tab.remove_handlers(cdp.page.NavigatedWithinDocument, on_navigated)
+    elapsed = time.perf_counter() - start
+    logger.info("⏱️  landed on %s after %.2f s", host, elapsed)
+    record(f"wait:host {host}", elapsed)
+
+
+async def field_value(element) -> str:
+    """Return the current value of an input, textarea or contenteditable."""
+    value = await element.apply(
+        "(el) => ('value' in el ? el.value : el.innerText) ?? ''"
+    )
+    return (value or "").replace("\r\n", "\n")
+
+
+async def inject_text(tab, element, text: str, chunk_size: int = 500) -> str:
+    """
+    Replace the contents of `element` with `text` in one shot.
+
+    Tries CDP `Input.insertText` first (native input events), then the native
+    value setter plus the `input`/`change` events Angular and React listen for,
+    and only falls back to chunked `send_keys` when neither sticks.
+    Returns the strategy that worked.
+    """
+    with span("inject_text", chars=len(text)) as attrs:
+        strategy = await _inject_text(tab, element, text, chunk_size)
+        attrs["strategy"] = strategy
+    return strategy
+
+
+async def _inject_text(tab, element, text: str, chunk_size: int) -> str:
+    expected = text.replace("\r\n", "\n")
+
+    # 1️⃣ focus + select existing content so the insert replaces it
+    await element.apply(
+        "(el) => { el.focus(); el.select ? el.select() : "
+        "document.execCommand('selectAll'); }"
+    )
+    await tab.send(cdp.input_.insert_text(text=text))
+    if await field_value(element) == expected:
+        return "insert_text"
+
+    # 2️⃣ native value setter + framework events
+    await element.apply(
+        """(el) => {
+            const text = %s;
+            if (!('value' in el)) { el.innerText = text; }
+            else {
+                const proto = Object.getPrototypeOf(el);
+                Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, text);
+            }
+            el.dispatchEvent(new Event('input', { bubbles: true }));
+            el.dispatchEvent(new Event('change', { bubbles: true }));
+        }"""
+        % json.dumps(text)
+    )
+    if await field_value(element) == expected:
+        return "value_setter"
+
+    # 3️⃣ slow path: clear and type in chunks
+    logger.warning("Bulk text injection did not stick; typing %d chars", len(text))
+    await element.clear_input()
+    for i in range(0, len(text), chunk_size):
+        await element.send_keys(text[i : i + chunk_size])
+    actual = await field_value(element)
+    if actual != expected:
+        raise RuntimeError(
+            f"Field contents differ after typing ({len(actual)}/{len(expected)} chars)"
+        )
+    return "send_keys"
+
+
+@asynccontextmanager
+async def browser_session(
+    profile_name: str, pool: BrowserPool | None = None, headless: bool | None = None
+):
+    """
+    Yield `(browser, tab)` for a stage.
+
+    With a pool the stage gets a fresh tab in a warm browser; without one a
+    dedicated browser is started and stopped around the stage.
+    """
+    if pool is not None:
+        async with pool.tab(profile_name) as session:
+            yield session
+        return
+
+    if headless is None:
+        headless = default_headless()
+    browser = await start_browser(profile_name=profile_name, headless=headless)
+    try:
+        await prepare_tab(browser.main_tab, profile_name, headless)
+        yield browser, browser.main_tab
+    finally:
+        await browser.stop()